@@ -90,11 +90,13 @@ CREATE TABLE IF NOT EXISTS vector_store_entries (
 -- Indexes for performance
 CREATE INDEX idx_sessions_project_id ON sessions(project_id);
 CREATE INDEX idx_sessions_status ON sessions(status);
+CREATE INDEX IF NOT EXISTS idx_sessions_status_project ON sessions(status, project_id);
 CREATE INDEX idx_sessions_expires_at ON sessions(expires_at);
 CREATE INDEX idx_sessions_subscription ON sessions(subscription_id);
 CREATE INDEX idx_sessions_unique_id ON sessions(unique_id);
 CREATE INDEX idx_sessions_type_project_unique ON sessions(session_type, project_id, unique_id);
 CREATE INDEX idx_sessions_pipeline_lookup ON sessions(session_type, project_id, pipeline_id) WHERE session_type = 'pipeline';
+CREATE INDEX IF NOT EXISTS idx_sessions_active_project_branch ON sessions(project_id, branch) WHERE status = 'active';
 
 CREATE INDEX idx_subscriptions_project ON webhook_subscriptions(project_id);
 CREATE INDEX idx_subscriptions_status ON webhook_subscriptions(status);
@@ -102,6 +104,7 @@ CREATE INDEX idx_subscriptions_expires ON webhook_subscriptions(expires_at);
 CREATE INDEX idx_subscriptions_api_key ON webhook_subscriptions(api_key);
 
 CREATE INDEX idx_fix_attempts_session ON fix_attempts(session_id);
+CREATE INDEX IF NOT EXISTS idx_fix_attempts_pending_branch ON fix_attempts(branch_name) WHERE status = 'pending';
 CREATE INDEX idx_messages_session ON messages(session_id);
 CREATE INDEX idx_vector_entries_project ON vector_store_entries(project_id);
 
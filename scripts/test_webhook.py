@@ -2,10 +2,13 @@
 """
 Test script to simulate GitLab webhook for pipeline failure
 """
+import os
 import requests
 import json
 from datetime import datetime
 
+UI_BASE_URL = os.getenv("UI_BASE_URL", "http://localhost:8501")
+
 # Sample GitLab pipeline failure webhook payload
 webhook_payload = {
     "object_kind": "pipeline",
@@ -89,11 +92,11 @@ def test_webhook(url="http://localhost:8000/webhook/gitlab"):
         print(f"📡 Response Status: {response.status_code}")
         print(f"📄 Response Body: {json.dumps(response.json(), indent=2)}")
         
-        if response.status_code == 200:
+        if response.status_code in (200, 202):
             result = response.json()
             if "session_id" in result:
                 print(f"\n✅ Success! Session ID: {result['session_id']}")
-                print(f"🌐 View analysis at: http://localhost:8501/?session={result['session_id']}")
+                print(f"🌐 View analysis at: {UI_BASE_URL}/?session={result['session_id']}")
         else:
             print(f"\n❌ Error: {response.status_code}")
             
@@ -1,14 +1,19 @@
 """Base agent class with common functionality following Strands Agent best practices"""
 from abc import ABC, abstractmethod
 from typing import Dict, Any, List, Optional
+import asyncio
 import os
 import re
-from datetime import datetime
+from datetime import datetime, timezone
 
+from strands import tool
 from utils.logger import log
+from utils.context_extractor import ContextExtractor
 from config import settings
 from db.models import SessionContext
-from db.session_manager import SessionManager
+from db.session_manager import get_session_manager
+from tools.gitlab import get_file_content, get_pipeline_jobs, get_job_logs, get_shared_gitlab_client
+from .tool_registry import tool_registry
 
 
 class BaseAnalysisAgent(ABC):
@@ -18,7 +23,7 @@ class BaseAnalysisAgent(ABC):
         """Initialize base agent with model and session manager"""
         self.agent_type = agent_type
         self.model = self._initialize_model()
-        self._session_manager = SessionManager()
+        self._session_manager = get_session_manager()
         log.info(f"{agent_type} agent initialized")
     
     def _initialize_model(self):
@@ -85,8 +90,6 @@ class BaseAnalysisAgent(ABC):
     
     def create_tracked_file_tool(self, session_id: str, current_fix_branch: Optional[str] = None):
         """Create a tracked file content tool for the session"""
-        from tools.gitlab import get_file_content
-        from strands import tool
         
         @tool
         async def get_file_content_tracked(
@@ -122,8 +125,6 @@ class BaseAnalysisAgent(ABC):
     
     def create_session_data_tool(self, session_id: str):
         """Create a tool to retrieve session data"""
-        from strands import tool
-        
         @tool
         async def get_session_data() -> Dict[str, Any]:
             """Get stored analysis data and tracked files from the current session for context"""
@@ -182,26 +183,21 @@ class BaseAnalysisAgent(ABC):
         
         # Create context tool if webhook data is available
         if webhook_data:
-            from utils.context_extractor import ContextExtractor
             context_tool = ContextExtractor.create_context_tool(session_id, webhook_data, self.agent_type.lower())
             session_tools.append(context_tool)
         
         # Get tools from registry based on agent type
-        from .tool_registry import tool_registry
         all_tools = tool_registry.get_tools_for_agent(self.agent_type, session_tools)
         
         return all_tools
     
     def get_capabilities_description(self) -> str:
         """Get dynamic capabilities description for this agent type"""
-        from .tool_registry import tool_registry
         return tool_registry.get_capability_description(self.agent_type)
     
     async def get_pipeline_logs(self, project_id: str, pipeline_id: str) -> str:
         """Get pipeline logs for analysis"""
         try:
-            from tools.gitlab import get_pipeline_jobs, get_job_logs
-            
             # Get all jobs in the pipeline
             jobs = await get_pipeline_jobs(pipeline_id, project_id)
             
@@ -324,32 +320,33 @@ I've attempted to fix this issue {max_attempts} times but it continues to fail.
         mr_id = mr_url.split('/')[-1]
         
         # Query GitLab API for MR details
-        from tools.gitlab import get_gitlab_client
-        
         try:
-            async with await get_gitlab_client() as client:
-                response = await client.get(f"/projects/{project_id}/merge_requests/{mr_id}")
+            client = await get_shared_gitlab_client()
+            # MR details and its changed files are independent; fetch them together
+            response, changes_response = await asyncio.gather(
+                client.get(f"/projects/{project_id}/merge_requests/{mr_id}"),
+                client.get(f"/projects/{project_id}/merge_requests/{mr_id}/changes")
+            )
+            
+            if response.status_code == 200:
+                mr_data = response.json()
+                branch_name = mr_data.get('source_branch')
                 
-                if response.status_code == 200:
-                    mr_data = response.json()
-                    branch_name = mr_data.get('source_branch')
-                    
-                    # Get files changed
-                    changes_response = await client.get(f"/projects/{project_id}/merge_requests/{mr_id}/changes")
-                    files_changed = []
-                    
-                    if changes_response.status_code == 200:
-                        changes_data = changes_response.json()
-                        for change in changes_data.get('changes', []):
-                            files_changed.append(change.get('new_path', change.get('old_path', '')))
-                    
-                    log.info(f"Retrieved MR details - ID: {mr_id}, Branch: {branch_name}, Files: {files_changed}")
+                # Get files changed
+                files_changed = []
+                
+                if changes_response.status_code == 200:
+                    changes_data = changes_response.json()
+                    for change in changes_data.get('changes', []):
+                        files_changed.append(change.get('new_path', change.get('old_path', '')))
+                
+                log.info(f"Retrieved MR details - ID: {mr_id}, Branch: {branch_name}, Files: {files_changed}")
+                
+                if branch_name:
+                    await self._update_session_with_mr(
+                        session_id, branch_name, mr_id, mr_url, files_changed
+                    )
                     
-                    if branch_name:
-                        await self._update_session_with_mr(
-                            session_id, branch_name, mr_id, mr_url, files_changed
-                        )
-                        
         except Exception as e:
             log.error(f"Error querying GitLab API for MR details: {e}", exc_info=True)
         
@@ -364,6 +361,8 @@ I've attempted to fix this issue {max_attempts} times but it continues to fail.
         files_changed: List[str]
     ):
         """Update session with merge request information"""
+        # Branch names are stored normalized so success lookups can compare directly
+        branch_name = branch_name.strip()
         try:
             # Create fix attempt
             attempt_num = await self._session_manager.create_fix_attempt(
@@ -400,22 +399,14 @@ I've attempted to fix this issue {max_attempts} times but it continues to fail.
         mr_url: str
     ):
         """Update webhook data with fix attempt information"""
-        current_session = await self._session_manager.get_session(session_id)
-        if current_session:
-            webhook_data = current_session.get("webhook_data", {})
-            fix_attempts_list = webhook_data.get("fix_attempts", [])
-            fix_attempts_list.append({
-                "branch": branch_name,
-                "mr_id": mr_id,
-                "mr_url": mr_url,
-                "status": "pending",
-                "timestamp": datetime.utcnow().isoformat()
-            })
-            webhook_data["fix_attempts"] = fix_attempts_list
-            await self._session_manager.update_session_metadata(
-                session_id, {"webhook_data": webhook_data}
-            )
-            log.info("Updated webhook_data with fix attempt")
+        await self._session_manager.append_webhook_fix_attempt(session_id, {
+            "branch": branch_name,
+            "mr_id": mr_id,
+            "mr_url": mr_url,
+            "status": "pending",
+            "timestamp": datetime.now(timezone.utc).isoformat()
+        })
+        log.info("Updated webhook_data with fix attempt")
     
     @abstractmethod
     async def analyze_failure(self, *args, **kwargs) -> str:
@@ -2,9 +2,10 @@
 
 from strands import Agent, tool
 from typing import Dict, Any, List
+from functools import lru_cache
 from utils.logger import log
 from .base_agent import BaseAnalysisAgent
-from .prompts import get_pipeline_system_prompt
+from .prompts import get_pipeline_system_prompt, get_conversation_continuation_prompt
 from agents.tool_registry import tool_registry
 from utils.context_extractor import ContextExtractor
 from tools.gitlab import (
@@ -92,7 +93,6 @@ class PipelineAgent(BaseAnalysisAgent):
             # Get context tool if webhook data available
             context_tool = None
             if webhook_data:
-                from utils.context_extractor import ContextExtractor
                 context_tool = ContextExtractor.create_context_tool(session_id, webhook_data, "pipeline")
             
             # Create tools list with conditional context tool
@@ -118,7 +118,6 @@ class PipelineAgent(BaseAnalysisAgent):
             
             # Format conversation context
             context = self.format_conversation_history(conversation_history)
-            from .prompts import get_conversation_continuation_prompt
             continuation_prompt = get_conversation_continuation_prompt("pipeline", context)
             
             # Combine prompts
@@ -166,3 +165,9 @@ Start by calling `get_failure_context()` to get all the essential information yo
 
 # Backward compatibility alias
 PipelineAnalysisAgent = PipelineAgent
+
+
+@lru_cache(maxsize=1)
+def get_pipeline_agent() -> PipelineAgent:
+    """Get the shared pipeline agent instance (model is initialized once per process)"""
+    return PipelineAgent()
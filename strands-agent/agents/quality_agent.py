@@ -2,10 +2,11 @@
 
 from strands import Agent, tool
 from typing import Dict, Any, List
+from functools import lru_cache
 import json
 from utils.logger import log
 from .base_agent import BaseAnalysisAgent
-from .prompts import get_quality_system_prompt
+from .prompts import get_quality_system_prompt, get_conversation_continuation_prompt
 from agents.tool_registry import tool_registry
 from utils.context_extractor import ContextExtractor
 from tools.sonarqube import (
@@ -144,7 +145,6 @@ Focus on addressing the failed quality gate conditions first."""
             )
             
             # Create wrapped get_file_content that stores files immediately - WORKING PATTERN
-            from tools.gitlab import get_file_content
             
             @tool
             async def tracked_get_file_content(file_path: str, project_id: str, ref: str = "HEAD") -> str:
@@ -237,7 +237,6 @@ Focus on addressing the failed quality gate conditions first."""
             # Get context tool if webhook data available
             context_tool = None
             if webhook_data:
-                from utils.context_extractor import ContextExtractor
                 context_tool = ContextExtractor.create_context_tool(session_id, webhook_data, "quality")
             
             # Create tools list with conditional context tool
@@ -265,7 +264,6 @@ Focus on addressing the failed quality gate conditions first."""
             
             # Format conversation context
             context = self.format_conversation_history(conversation_history)
-            from .prompts import get_conversation_continuation_prompt
             continuation_prompt = get_conversation_continuation_prompt("quality", context)
             
             # Combine prompts
@@ -325,9 +323,6 @@ Start by calling `get_failure_context()` to get all the essential information yo
             if sonarqube_data:
                 # We have pre-fetched SonarQube data - use it directly for analysis
                 total_issues = sonarqube_data.get("total_issues", 0)
-                bugs = sonarqube_data.get("bugs", [])
-                vulnerabilities = sonarqube_data.get("vulnerabilities", [])
-                code_smells = sonarqube_data.get("code_smells", [])
                 
                 log.info(f"Using pre-fetched SonarQube data: {total_issues} total issues")
                 
@@ -341,9 +336,9 @@ Start by calling `get_failure_context()` to get all the essential information yo
 
 **Quality Issues Summary:**
 - Total Issues: {total_issues}
-- Bugs: {len(bugs)}
-- Vulnerabilities: {len(vulnerabilities)}
-- Code Smells: {len(code_smells)}
+- Bugs: {sonarqube_data.get("bug_count", 0)}
+- Vulnerabilities: {sonarqube_data.get("vulnerability_count", 0)}
+- Code Smells: {sonarqube_data.get("code_smell_count", 0)}
 - Critical Issues: {sonarqube_data.get("critical_issues", 0)}
 - Major Issues: {sonarqube_data.get("major_issues", 0)}
 
@@ -435,3 +430,9 @@ Analysis approach:
 
 # Backward compatibility alias
 QualityAnalysisAgent = QualityAgent
+
+
+@lru_cache(maxsize=1)
+def get_quality_agent() -> QualityAgent:
+    """Get the shared quality agent instance (model is initialized once per process)"""
+    return QualityAgent()
@@ -6,6 +6,12 @@ import inspect
 from pathlib import Path
 import os
 
+try:
+    from strands.tools.decorator import DecoratedFunctionTool
+except ImportError:
+    # Strands SDK not available; discovery falls back to attribute checking
+    DecoratedFunctionTool = None
+
 
 def extract_tool_description(tool: Callable) -> str:
     """Extract description from a tool function - shared utility"""
@@ -28,17 +34,14 @@ def discover_tools_in_module(module_name: str) -> List[Callable]:
         # Use the same pattern as Strands SDK _scan_module_for_tools
         for name, obj in inspect.getmembers(module):
             # Check if it's a DecoratedFunctionTool (the type created by @tool decorator)
-            try:
-                # Import DecoratedFunctionTool to check isinstance
-                from strands.tools.decorator import DecoratedFunctionTool
-                
+            if DecoratedFunctionTool is not None:
                 if isinstance(obj, DecoratedFunctionTool):
                     # According to Strands documentation, we should pass the DecoratedFunctionTool objects directly
                     # The Agent constructor can handle them properly
                     tools.append(obj)
                     print(f"Found Strands tool: {name} -> {obj} (DecoratedFunctionTool)")
                     
-            except ImportError:
+            else:
                 # Strands SDK not available, fall back to attribute checking
                 if (hasattr(obj, 'tool_spec') and 
                     hasattr(obj, 'tool_name') and 
@@ -3,18 +3,18 @@ from fastapi import APIRouter, HTTPException
 from typing import Dict, Any
 from pydantic import BaseModel
 from utils.logger import log
-from db.session_manager import SessionManager
-from agents.pipeline_agent import PipelineAgent
-from agents.quality_agent import QualityAgent
+from db.session_manager import get_session_manager
+from agents.pipeline_agent import get_pipeline_agent
+from agents.quality_agent import get_quality_agent
 # Vector store import removed - will be added when implemented
 # from services.vector_store import VectorStore
 
 router = APIRouter(prefix="/analysis", tags=["analysis"])
 
 # Initialize components
-session_manager = SessionManager()
-pipeline_agent = PipelineAgent()
-quality_agent = QualityAgent()
+session_manager = get_session_manager()
+pipeline_agent = get_pipeline_agent()
+quality_agent = get_quality_agent()
 # vector_store = VectorStore()  # Commented until implemented
 
 class AnalysisRequest(BaseModel):
@@ -90,17 +90,8 @@ async def search_previous_fixes(request: SearchRequest):
 async def get_project_stats(project_id: str):
     """Get analysis statistics for a project"""
     try:
-        # Get sessions for project
-        sessions = await session_manager.get_project_sessions(project_id)
-        
-        stats = {
-            "total_sessions": len(sessions),
-            "pipeline_failures": sum(1 for s in sessions if s.get("session_type") == "pipeline"),
-            "quality_issues": sum(1 for s in sessions if s.get("session_type") == "quality"),
-            "successful_fixes": sum(1 for s in sessions if s.get("fix_status") == "success"),
-            "pending_fixes": sum(1 for s in sessions if s.get("fix_status") == "pending"),
-            "failed_fixes": sum(1 for s in sessions if s.get("fix_status") == "failed")
-        }
+        # Aggregate in the database instead of pulling every session row
+        stats = await session_manager.get_project_session_stats(project_id)
         
         return stats
         
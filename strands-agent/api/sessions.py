@@ -1,20 +1,19 @@
 """Session management API endpoints"""
-import json
 import re
 from fastapi import APIRouter, HTTPException
 from typing import Dict, Any, List
 from pydantic import BaseModel
 from utils.logger import log
-from db.session_manager import SessionManager
-from agents.pipeline_agent import PipelineAgent
-from agents.quality_agent import QualityAgent
+from db.session_manager import get_session_manager
+from agents.pipeline_agent import get_pipeline_agent
+from agents.quality_agent import get_quality_agent
 
 router = APIRouter(prefix="/sessions", tags=["sessions"])
 
 # Initialize components
-session_manager = SessionManager()
-pipeline_agent = PipelineAgent()
-quality_agent = QualityAgent()
+session_manager = get_session_manager()
+pipeline_agent = get_pipeline_agent()
+quality_agent = get_quality_agent()
 
 class MessageRequest(BaseModel):
     message: str
@@ -58,12 +57,10 @@ async def send_message(session_id: str, request: MessageRequest):
         if not context:
             raise HTTPException(status_code=404, detail="Session not found")
         
-        # Add user message
-        await session_manager.add_message(session_id, "user", request.message)
-        
-        # Get conversation history
-        session = await session_manager.get_session(session_id)
-        conversation_history = session.get("conversation_history", [])
+        # Add user message and get the resulting conversation history
+        conversation_history = await session_manager.add_message_and_get_history(
+            session_id, "user", request.message
+        )
         
         # Route to appropriate agent
         if context.session_type == "quality":
@@ -212,39 +209,3 @@ def extract_files_from_response(response_text: str) -> Dict[str, str]:
                 files[match] = "modified"
     
     return files
-
-
-async def store_file_analysis(self, session_id: str, file_path: str, original_content: str, proposed_changes: str):
-    """Store file analysis for a specific file in a session"""
-    async with self.get_connection() as conn:
-        # Store in a JSONB field in sessions table
-        current = await conn.fetchval(
-            "SELECT webhook_data FROM sessions WHERE id = $1",
-            session_id
-        )
-        
-        webhook_data = json.loads(current) if current else {}
-        
-        # Initialize file_analysis if not exists
-        if 'file_analysis' not in webhook_data:
-            webhook_data['file_analysis'] = {}
-        
-        # Store file data
-        webhook_data['file_analysis'][file_path] = {
-            'original_content': original_content,
-            'proposed_changes': proposed_changes,
-            'timestamp': datetime.utcnow().isoformat()
-        }
-        
-        await conn.execute(
-            "UPDATE sessions SET webhook_data = $2::jsonb WHERE id = $1",
-            session_id, json.dumps(webhook_data)
-        )
-        log.info(f"Stored file analysis for {file_path} in session {session_id}")
-
-async def get_file_analysis(self, session_id: str) -> Dict[str, Any]:
-    """Get all file analysis for a session"""
-    session = await self.get_session(session_id)
-    if session:
-        return session.get('webhook_data', {}).get('file_analysis', {})
-    return {}
\ No newline at end of file
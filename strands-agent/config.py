@@ -63,6 +63,7 @@ class Settings(BaseSettings):
     # Processing settings
     max_log_size: int = int(os.getenv("MAX_LOG_SIZE", "30000"))
     max_log_lines: int = int(os.getenv("MAX_LOG_LINES", "1000"))
+    max_concurrent_analyses: int = int(os.getenv("MAX_CONCURRENT_ANALYSES", "4"))
     
     # Vector store settings
     vector_dimension: int = 768
@@ -3,7 +3,7 @@ from typing import Dict, Any, List, Optional
 from dataclasses import dataclass, asdict
 from datetime import datetime
 
-@dataclass
+@dataclass(slots=True)
 class SessionContext:
     """Complete session context for agent invocations"""
     session_id: str
@@ -39,7 +39,7 @@ class SessionContext:
                     result[k] = v
         return result
 
-@dataclass
+@dataclass(slots=True)
 class HistoricalFix:
     """Historical fix information"""
     error_signature: str
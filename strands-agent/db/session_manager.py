@@ -1,17 +1,32 @@
 """Session management for persistent conversations"""
+import asyncio
 import asyncpg
 import json
 import hashlib
-from typing import Dict, Any, Optional, List
-from datetime import datetime, timedelta
+from typing import Dict, Any, Optional, List, Set
+from datetime import datetime, timedelta, timezone
 from contextlib import asynccontextmanager
+from functools import lru_cache
 from utils.logger import log
 from config import settings
 from db.models import SessionContext
 
+# Indexes the session lookups rely on. init.sql only runs when the database
+# is first created, so they are also ensured at startup for existing deployments.
+_REQUIRED_INDEXES = (
+    "CREATE INDEX IF NOT EXISTS idx_sessions_status_project ON sessions(status, project_id)",
+    "CREATE INDEX IF NOT EXISTS idx_sessions_active_project_branch ON sessions(project_id, branch) WHERE status = 'active'",
+    "CREATE INDEX IF NOT EXISTS idx_fix_attempts_pending_branch ON fix_attempts(branch_name) WHERE status = 'pending'",
+)
+
+# Cancellation message for analyses stopped because their session was closed
+SESSION_CLOSED = "session closed"
+
 class SessionManager:
     def __init__(self):
         self._pool = None
+        # Running analysis tasks per session, so closing a session stops its work
+        self._analysis_tasks: Dict[str, Set[asyncio.Task]] = {}
     
     async def init_pool(self):
         """Initialize connection pool"""
@@ -32,6 +47,13 @@ class SessionManager:
                     max_size=settings.db_pool_max_size
                 )
                 log.info(f"Database connection pool initialized (min: {settings.db_pool_min_size}, max: {settings.db_pool_max_size})")
+            await self._ensure_indexes()
+    
+    async def _ensure_indexes(self):
+        """Create any missing indexes from _REQUIRED_INDEXES"""
+        async with self._pool.acquire() as conn:
+            for statement in _REQUIRED_INDEXES:
+                await conn.execute(statement)
     
     @asynccontextmanager
     async def get_connection(self):
@@ -122,6 +144,18 @@ class SessionManager:
             webhook_data=session.get('webhook_data', {})
         )
     
+    @staticmethod
+    def _session_row_to_dict(session) -> Dict[str, Any]:
+        """Convert a sessions row to a dict, parsing its JSON fields"""
+        result = dict(session)
+        for field in ['conversation_history', 'webhook_data', 'fixes_applied']:
+            if field in result and isinstance(result[field], str):
+                try:
+                    result[field] = json.loads(result[field])
+                except:
+                    result[field] = [] if field in ['conversation_history', 'fixes_applied'] else {}
+        return result
+    
     async def get_active_sessions(self) -> List[Dict[str, Any]]:
         """Get all active sessions"""
         async with self.get_connection() as conn:
@@ -133,47 +167,147 @@ class SessionManager:
                 ORDER BY created_at DESC
                 """
             )
-            results = []
-            for session in sessions:
-                result = dict(session)
-                # Parse JSON fields
-                for field in ['conversation_history', 'webhook_data', 'fixes_applied']:
-                    if field in result and isinstance(result[field], str):
-                        try:
-                            result[field] = json.loads(result[field])
-                        except:
-                            result[field] = [] if field in ['conversation_history', 'fixes_applied'] else {}
-                results.append(result)
+            results = [self._session_row_to_dict(session) for session in sessions]
             log.debug(f"Found {len(results)} active sessions")
             return results
     
+    async def get_project_session_stats(self, project_id: str) -> Dict[str, int]:
+        """Count a project's sessions by type and its fix attempts by status in one query"""
+        async with self.get_connection() as conn:
+            row = await conn.fetchrow(
+                """
+                WITH project_sessions AS (
+                    SELECT id, session_type FROM sessions WHERE project_id = $1
+                ), session_counts AS (
+                    SELECT COUNT(*) AS total_sessions,
+                           COUNT(*) FILTER (WHERE session_type = 'pipeline') AS pipeline_failures,
+                           COUNT(*) FILTER (WHERE session_type = 'quality') AS quality_issues
+                    FROM project_sessions
+                ), fix_counts AS (
+                    SELECT COUNT(*) FILTER (WHERE fa.status = 'success') AS successful_fixes,
+                           COUNT(*) FILTER (WHERE fa.status = 'pending') AS pending_fixes,
+                           COUNT(*) FILTER (WHERE fa.status = 'failed') AS failed_fixes
+                    FROM fix_attempts fa
+                    JOIN project_sessions ps ON ps.id = fa.session_id
+                )
+                SELECT * FROM session_counts, fix_counts
+                """,
+                str(project_id)
+            )
+            return dict(row)
+    
+    async def get_active_session_with_pending_fix(self, project_id: str, branch_name: str) -> Optional[Dict[str, Any]]:
+        """Get the active session whose pending fix attempt was pushed to branch_name
+        
+        Driven by the pending-branch index on fix_attempts; branch names are
+        stripped when attempts are created, so a plain equality matches. The
+        session row is returned with the matching attempt's number and MR URL
+        as fix_attempt_number and fix_merge_request_url.
+        """
+        async with self.get_connection() as conn:
+            session = await conn.fetchrow(
+                """
+                SELECT s.*,
+                       fa.attempt_number AS fix_attempt_number,
+                       fa.merge_request_url AS fix_merge_request_url
+                FROM sessions s
+                JOIN fix_attempts fa ON fa.session_id = s.id
+                WHERE s.status = 'active'
+                AND s.project_id = $1
+                AND s.expires_at > CURRENT_TIMESTAMP
+                AND fa.branch_name = $2
+                AND fa.status = 'pending'
+                ORDER BY s.created_at DESC, fa.attempt_number ASC
+                LIMIT 1
+                """,
+                str(project_id), branch_name
+            )
+            return self._session_row_to_dict(session) if session else None
+    
+    async def get_session_ready_to_resolve(self, project_id: str, branch: str) -> Optional[Dict[str, Any]]:
+        """Get the newest active session targeting branch that has an MR and a successful fix attempt"""
+        async with self.get_connection() as conn:
+            session = await conn.fetchrow(
+                """
+                SELECT s.* FROM sessions s
+                WHERE s.status = 'active'
+                AND s.project_id = $1
+                AND s.expires_at > CURRENT_TIMESTAMP
+                AND s.merge_request_url IS NOT NULL
+                AND s.branch = $2
+                AND EXISTS (
+                    SELECT 1 FROM fix_attempts fa
+                    WHERE fa.session_id = s.id AND fa.status = 'success'
+                )
+                ORDER BY s.created_at DESC
+                LIMIT 1
+                """,
+                str(project_id), branch
+            )
+            return self._session_row_to_dict(session) if session else None
+    
     async def add_message(self, session_id: str, role: str, content: str):
         """Add message to conversation history"""
+        history_entry = {
+            "role": role,
+            "content": content,
+            "timestamp": datetime.now(timezone.utc).isoformat()
+        }
         async with self.get_connection() as conn:
-            # Get current history
-            current = await conn.fetchval(
-                "SELECT conversation_history FROM sessions WHERE id = $1",
-                session_id
+            # Append in place rather than reading and rewriting the whole history
+            await conn.execute(
+                """
+                UPDATE sessions 
+                SET conversation_history = COALESCE(conversation_history, '[]'::jsonb) || jsonb_build_array($2::jsonb),
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE id = $1
+                """,
+                session_id, json.dumps(history_entry)
             )
-            
-            history = json.loads(current) if current else []
-            history.append({
-                "role": role,
-                "content": content,
-                "timestamp": datetime.utcnow().isoformat()
-            })
-            
-            # Update
+            log.debug(f"Added {role} message to session {session_id}")
+    
+    async def record_analysis_error(self, session_id: str, content: str, error: str):
+        """Post an analysis failure message and store the error on the session in one statement"""
+        history_entry = {
+            "role": "assistant",
+            "content": content,
+            "timestamp": datetime.now(timezone.utc).isoformat()
+        }
+        async with self.get_connection() as conn:
             await conn.execute(
+                """
+                UPDATE sessions
+                SET conversation_history = COALESCE(conversation_history, '[]'::jsonb) || jsonb_build_array($2::jsonb),
+                    webhook_data = COALESCE(webhook_data, '{}'::jsonb) || jsonb_build_object('analysis_error', $3::text),
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE id = $1
+                """,
+                session_id, json.dumps(history_entry), error
+            )
+            log.debug(f"Recorded analysis error for session {session_id}")
+    
+    async def add_message_and_get_history(self, session_id: str, role: str, content: str) -> List[Dict[str, Any]]:
+        """Add message to conversation history and return the updated history in one statement"""
+        history_entry = {
+            "role": role,
+            "content": content,
+            "timestamp": datetime.now(timezone.utc).isoformat()
+        }
+        async with self.get_connection() as conn:
+            history = await conn.fetchval(
                 """
                 UPDATE sessions 
-                SET conversation_history = $2::jsonb,
+                SET conversation_history = COALESCE(conversation_history, '[]'::jsonb) || jsonb_build_array($2::jsonb),
                     updated_at = CURRENT_TIMESTAMP
                 WHERE id = $1
+                RETURNING conversation_history
                 """,
-                session_id, json.dumps(history)
+                session_id, json.dumps(history_entry)
             )
             log.debug(f"Added {role} message to session {session_id}")
+            if isinstance(history, str):
+                history = json.loads(history)
+            return history or []
     
     async def store_tracked_file(self, session_id: str, file_path: str, content: Optional[str], status: str = "success"):
         """Store a tracked file in the database"""
@@ -220,25 +354,21 @@ class SessionManager:
         """Create a new fix attempt record"""
         branch_name = branch_name.strip()
         async with self.get_connection() as conn:
-            # Ensure session_id is properly formatted
-            import uuid
-            if isinstance(session_id, str):
-                session_uuid = uuid.UUID(session_id)
-            else:
-                session_uuid = session_id
+            # sessions.id is VARCHAR, so the id is bound as a string
+            session_id = str(session_id)
             
             # Use transaction for atomicity
             async with conn.transaction():
                 # Lock the session row to prevent concurrent modifications
                 await conn.execute(
                     "SELECT id FROM sessions WHERE id = $1 FOR UPDATE",
-                    session_uuid
+                    session_id
                 )
                 
                 # Now get the current iteration count
                 current_iteration = await conn.fetchval(
                     "SELECT COALESCE(MAX(attempt_number), 0) FROM fix_attempts WHERE session_id = $1",
-                    session_uuid
+                    session_id
                 )
                 
                 new_attempt = current_iteration + 1
@@ -254,7 +384,7 @@ class SessionManager:
                     INSERT INTO fix_attempts (session_id, attempt_number, branch_name, files_changed, status)
                     VALUES ($1, $2, $3, $4, 'pending')
                     """,
-                    session_uuid, new_attempt, branch_name, json.dumps(files_changed)
+                    session_id, new_attempt, branch_name, json.dumps(files_changed)
                 )
                 
                 # Update session
@@ -264,7 +394,7 @@ class SessionManager:
                     SET current_fix_branch = $2, fix_iteration = $3
                     WHERE id = $1
                     """,
-                    session_uuid, branch_name, new_attempt
+                    session_id, branch_name, new_attempt
                 )
             
             log.info(f"Created fix attempt #{new_attempt} for session {session_id}")
@@ -275,12 +405,8 @@ class SessionManager:
                                 error_details: Optional[str] = None):
         """Update fix attempt status"""
         async with self.get_connection() as conn:
-            # Ensure session_id is properly formatted
-            import uuid
-            if isinstance(session_id, str):
-                session_uuid = uuid.UUID(session_id)
-            else:
-                session_uuid = session_id
+            # sessions.id is VARCHAR, so the id is bound as a string
+            session_id = str(session_id)
                 
             await conn.execute(
                 """
@@ -292,7 +418,7 @@ class SessionManager:
                     completed_at = CASE WHEN $3 IN ('success', 'failed') THEN CURRENT_TIMESTAMP ELSE NULL END
                 WHERE session_id = $1 AND attempt_number = $2
                 """,
-                session_uuid, attempt_number, status, mr_id, mr_url, error_details
+                session_id, attempt_number, status, mr_id, mr_url, error_details
             )
             
             # Update session MR info if successful
@@ -303,9 +429,55 @@ class SessionManager:
                     SET merge_request_url = $2, merge_request_id = $3
                     WHERE id = $1
                     """,
-                    session_uuid, mr_url, mr_id
+                    session_id, mr_url, mr_id
                 )
     
+    async def complete_fix_attempt(self, session_id: str, attempt_number: int, message: str,
+                                   ui_attempt_index: Optional[int] = None):
+        """Mark a fix attempt successful and post a message in one statement
+        
+        ui_attempt_index is the position of the attempt in webhook_data's
+        fix_attempts list; only that element is patched, in place. A stale or
+        out-of-range index leaves webhook_data unchanged.
+        """
+        session_id = str(session_id)
+        now = datetime.now(timezone.utc).isoformat()
+        history_entry = {
+            "role": "assistant",
+            "content": message,
+            "timestamp": now
+        }
+        
+        async with self.get_connection() as conn:
+            await conn.execute(
+                """
+                WITH attempt AS (
+                    UPDATE fix_attempts
+                    SET status = 'success',
+                        completed_at = CURRENT_TIMESTAMP
+                    WHERE session_id = $1 AND attempt_number = $2
+                )
+                UPDATE sessions
+                SET webhook_data = CASE
+                        -- jsonb_set is strict: patching a missing element would null the column
+                        WHEN $3::int IS NULL
+                            OR webhook_data #> ARRAY['fix_attempts', ($3::int)::text] IS NULL
+                            THEN webhook_data
+                        ELSE jsonb_set(
+                            webhook_data,
+                            ARRAY['fix_attempts', ($3::int)::text],
+                            (webhook_data #> ARRAY['fix_attempts', ($3::int)::text])
+                                || jsonb_build_object('status', 'success', 'succeeded_at', $4::text)
+                        )
+                    END,
+                    conversation_history = COALESCE(conversation_history, '[]'::jsonb) || jsonb_build_array($5::jsonb),
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE id = $1
+                """,
+                session_id, attempt_number, ui_attempt_index, now, json.dumps(history_entry)
+            )
+            log.debug(f"Completed fix attempt #{attempt_number} for session {session_id}")
+    
     async def get_fix_attempts(self, session_id: str) -> List[Dict[str, Any]]:
         """Get all fix attempts for a session"""
         # Ensure session_id is string
@@ -347,23 +519,6 @@ class SessionManager:
         session_id = str(session_id)
         
         async with self.get_connection() as conn:
-            # Handle webhook_data specially to merge it
-            if "webhook_data" in metadata:
-                # Get current webhook_data
-                current = await conn.fetchval(
-                    "SELECT webhook_data FROM sessions WHERE id = $1",
-                    session_id
-                )
-                current_data = json.loads(current) if current else {}
-                
-                # Merge new data
-                new_webhook_data = metadata["webhook_data"]
-                if isinstance(new_webhook_data, dict):
-                    current_data.update(new_webhook_data)
-                    metadata["webhook_data"] = json.dumps(current_data)
-                else:
-                    metadata["webhook_data"] = json.dumps(new_webhook_data)
-            
             # Build update query
             updates = []
             params = [session_id]
@@ -371,8 +526,13 @@ class SessionManager:
             
             for key, value in metadata.items():
                 if key == "webhook_data":
-                    updates.append(f"webhook_data = ${param_num}::jsonb")
-                    params.append(value)
+                    # Dicts are merged into the stored object server-side (top-level keys win),
+                    # so only the changed keys are sent and there is no read-modify-write race
+                    if isinstance(value, dict):
+                        updates.append(f"webhook_data = COALESCE(webhook_data, '{{}}'::jsonb) || ${param_num}::jsonb")
+                    else:
+                        updates.append(f"webhook_data = ${param_num}::jsonb")
+                    params.append(json.dumps(value))
                 elif key == "merge_request_url":
                     updates.append(f"merge_request_url = ${param_num}")
                     params.append(value)
@@ -402,6 +562,25 @@ class SessionManager:
                 await conn.execute(query, *params)
                 log.debug(f"Updated metadata for session {session_id}")
     
+    async def append_webhook_fix_attempt(self, session_id: str, fix_attempt: Dict[str, Any]):
+        """Append a fix attempt entry to webhook_data's fix_attempts list in place"""
+        session_id = str(session_id)
+        async with self.get_connection() as conn:
+            await conn.execute(
+                """
+                UPDATE sessions
+                SET webhook_data = jsonb_set(
+                        COALESCE(webhook_data, '{}'::jsonb),
+                        '{fix_attempts}',
+                        COALESCE(webhook_data->'fix_attempts', '[]'::jsonb) || jsonb_build_array($2::jsonb)
+                    ),
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE id = $1
+                """,
+                session_id, json.dumps(fix_attempt)
+            )
+            log.debug(f"Appended fix attempt to webhook_data for session {session_id}")
+    
     async def update_quality_metrics(self, session_id: str, metrics: Dict[str, Any]):
         """Update quality metrics for a session"""
         async with self.get_connection() as conn:
@@ -448,6 +627,47 @@ class SessionManager:
             )
             log.info(f"Marked session {session_id} as resolved")
     
+    async def resolve_with_message(self, session_id: str, role: str, content: str):
+        """Mark session as resolved and append a message in one statement"""
+        history_entry = {
+            "role": role,
+            "content": content,
+            "timestamp": datetime.now(timezone.utc).isoformat()
+        }
+        async with self.get_connection() as conn:
+            await conn.execute(
+                """
+                UPDATE sessions
+                SET status = 'resolved',
+                    conversation_history = COALESCE(conversation_history, '[]'::jsonb) || jsonb_build_array($2::jsonb),
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE id = $1
+                """,
+                session_id, json.dumps(history_entry)
+            )
+            log.info(f"Marked session {session_id} as resolved")
+    
+    def track_analysis_task(self, session_id: str, task: asyncio.Task):
+        """Register a running analysis so cancel_session_analysis can stop it"""
+        tasks = self._analysis_tasks.setdefault(session_id, set())
+        tasks.add(task)
+        
+        def untrack(done: asyncio.Task):
+            tasks.discard(done)
+            if not tasks and self._analysis_tasks.get(session_id) is tasks:
+                del self._analysis_tasks[session_id]
+        
+        task.add_done_callback(untrack)
+    
+    def cancel_session_analysis(self, session_id: str) -> int:
+        """Cancel running analyses for a session; returns how many were cancelled"""
+        tasks = self._analysis_tasks.pop(session_id, set())
+        for task in tasks:
+            task.cancel(SESSION_CLOSED)
+        if tasks:
+            log.info(f"Cancelled {len(tasks)} running analyses for session {session_id}")
+        return len(tasks)
+    
     async def cleanup_expired_sessions(self):
         """Clean up expired sessions"""
         async with self.get_connection() as conn:
@@ -495,4 +715,10 @@ class SessionManager:
                 """,
                 project_id, mr_id
             )
-            return [dict(session) for session in sessions]
\ No newline at end of file
+            return [dict(session) for session in sessions]
+
+
+@lru_cache(maxsize=1)
+def get_session_manager() -> SessionManager:
+    """Get the process-wide session manager so every caller shares one pool"""
+    return SessionManager()
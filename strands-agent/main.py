@@ -7,8 +7,10 @@ from utils.logger import log
 from config import settings
 from api.sessions import router as session_router
 from api.analysis import router as analysis_router
-from db.session_manager import SessionManager
+from db.session_manager import SessionManager, get_session_manager
 from services.queue_processor import QueueProcessor
+from tools.gitlab import close_gitlab_client
+from tools.sonarqube import close_sonar_client
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -16,7 +18,7 @@ async def lifespan(app: FastAPI):
     log.info("Starting Strands Agent Service...")
     
     # Initialize database
-    session_manager = SessionManager()
+    session_manager = get_session_manager()
     await session_manager.init_pool()
     
     # Start queue processor only if configured (for webhook-handler events)
@@ -37,6 +39,8 @@ async def lifespan(app: FastAPI):
     if processor_task:
         processor_task.cancel()
     cleanup_task.cancel()
+    await close_gitlab_client()
+    await close_sonar_client()
     log.info("Shutting down...")
 
 async def periodic_cleanup(session_manager: SessionManager):
@@ -1,29 +1,54 @@
 """Queue processor for handling webhook events from webhook-handler"""
-import json
+import orjson
+import re
 import asyncio
-from typing import Dict, Any, Optional
+import contextlib
+from typing import Dict, Any, Optional, Set, Callable, Awaitable
 import aio_pika
 import boto3
-from datetime import datetime
 from utils.logger import log
 from config import settings
-from db.session_manager import SessionManager
-from agents.pipeline_agent import PipelineAgent
-from agents.quality_agent import QualityAgent
+from db.session_manager import get_session_manager, SESSION_CLOSED
+from agents.pipeline_agent import get_pipeline_agent
+from agents.quality_agent import get_quality_agent
+from tools.sonarqube import (
+    get_project_quality_gate_status,
+    fetch_quality_bundle,
+    sonar_analysis_id,
+    projects_without_quality_gate
+)
+from tools.gitlab import get_pipeline_jobs, iter_job_logs
 # from services.vector_store import VectorStore  # To be implemented
 
+# Log lines that mark a quality gate failure; matched case-insensitively in one pass
+QUALITY_GATE_INDICATORS = (
+    "Quality Gate failed",
+    "SonarQube analysis failed",
+    "Code coverage below threshold",
+    "Too many code smells",
+    "Security hotspots detected"
+)
+_QUALITY_GATE_RE = re.compile("|".join(map(re.escape, QUALITY_GATE_INDICATORS)), re.IGNORECASE)
+# Characters carried between streamed chunks so a marker split across a boundary still matches
+_QUALITY_GATE_OVERLAP = max(map(len, QUALITY_GATE_INDICATORS)) - 1
+
 class QueueProcessor:
     """Process webhook events from message queue"""
     
     def __init__(self):
-        self.session_manager = SessionManager()
-        self.pipeline_agent = PipelineAgent()
-        self.quality_agent = QualityAgent()
+        self.session_manager = get_session_manager()
+        self.pipeline_agent = get_pipeline_agent()
+        self.quality_agent = get_quality_agent()
         # self.vector_store = VectorStore()  # To be implemented
         self.connection = None
         self.channel = None
         self.sqs_client = None
         self.running = False
+        # Cap concurrent LLM analyses so a burst of failing pipelines waits
+        # here instead of overloading the model provider and the database pool
+        self._analysis_semaphore = asyncio.Semaphore(settings.max_concurrent_analyses)
+        # In-flight RabbitMQ deliveries, held so their tasks are not collected
+        self._message_tasks: Set[asyncio.Task] = set()
         
         if settings.queue_type == "sqs":
             self.sqs_client = boto3.client('sqs', region_name=settings.aws_region)
@@ -44,8 +69,8 @@ class QueueProcessor:
             self.connection = await aio_pika.connect_robust(settings.rabbitmq_url)
             self.channel = await self.connection.channel()
             
-            # Set prefetch count
-            await self.channel.set_qos(prefetch_count=1)
+            # Prefetch enough deliveries to keep every analysis slot busy
+            await self.channel.set_qos(prefetch_count=settings.max_concurrent_analyses)
             
             # Declare queue
             queue = await self.channel.declare_queue(
@@ -56,9 +81,10 @@ class QueueProcessor:
             # Start consuming
             async with queue.iterator() as queue_iter:
                 async for message in queue_iter:
-                    async with message.process():
-                        await self._process_message(json.loads(message.body))
-                        
+                    task = asyncio.create_task(self._process_rabbitmq_message(message))
+                    self._message_tasks.add(task)
+                    task.add_done_callback(self._message_tasks.discard)
+                    
                     if not self.running:
                         break
                         
@@ -68,6 +94,11 @@ class QueueProcessor:
                 await asyncio.sleep(5)
                 await self._start_rabbitmq()
     
+    async def _process_rabbitmq_message(self, message: aio_pika.IncomingMessage):
+        """Process one delivery, acknowledging it once handled"""
+        async with message.process():
+            await self._process_message(orjson.loads(message.body))
+    
     async def _start_sqs(self):
         """Start SQS consumer"""
         while self.running:
@@ -80,7 +111,7 @@ class QueueProcessor:
                 
                 if 'Messages' in response:
                     for message in response['Messages']:
-                        await self._process_message(json.loads(message['Body']))
+                        await self._process_message(orjson.loads(message['Body']))
                         
                         # Delete message after processing
                         self.sqs_client.delete_message(
@@ -101,6 +132,12 @@ class QueueProcessor:
             
             log.info(f"Processing {event_type} event for session {session_id}")
             
+            # Success events carry a project and ref, not a session; the
+            # handler finds the affected session itself
+            if event_type == "pipeline_success":
+                await self.handle_pipeline_success(data)
+                return
+            
             # Get session context
             context = await self.session_manager.get_session_context(session_id)
             if not context:
@@ -109,11 +146,9 @@ class QueueProcessor:
             
             # Route to appropriate handler
             if event_type == "pipeline_failed":
-                await self.handle_pipeline_failure(session_id, context, data)
-            elif event_type == "pipeline_success":
-                await self.handle_pipeline_success(session_id, context, data)
+                await self._run_analysis(self.handle_pipeline_failure, session_id, context, data)
             elif event_type == "quality_failed":
-                await self.analyze_quality_issues(session_id, context, data)
+                await self._run_analysis(self.analyze_quality_issues, session_id, context, data)
             elif event_type.startswith("merge_request_"):
                 await self.handle_merge_request_event(session_id, context, data)
             else:
@@ -122,6 +157,41 @@ class QueueProcessor:
         except Exception as e:
             log.error(f"Error processing message: {e}")
     
+    async def _run_analysis(
+        self,
+        handler: Callable[[str, Any, Dict[str, Any]], Awaitable[None]],
+        session_id: str,
+        context: Any,
+        data: Dict[str, Any]
+    ):
+        """Run an analysis in its own task, registered so closing the session cancels it"""
+        task = asyncio.create_task(self._bounded_analysis(handler, session_id, context, data))
+        self.session_manager.track_analysis_task(session_id, task)
+        await task
+    
+    async def _bounded_analysis(
+        self,
+        handler: Callable[[str, Any, Dict[str, Any]], Awaitable[None]],
+        session_id: str,
+        context: Any,
+        data: Dict[str, Any]
+    ):
+        """Run an analysis under the analysis semaphore, stopping if its session closes"""
+        try:
+            async with self._analysis_semaphore:
+                await handler(session_id, context, data)
+        except asyncio.CancelledError as e:
+            if e.args != (SESSION_CLOSED,):
+                raise
+            # Only this analysis was stopped; clear the request so the task can finish
+            asyncio.current_task().uncancel()
+            log.info(f"Stopped {handler.__name__} for closed session {session_id}")
+            await self.session_manager.add_message(
+                session_id,
+                "assistant",
+                "Analysis stopped: the session was closed before the analysis finished."
+            )
+    
     async def handle_pipeline_failure(
         self,
         session_id: str,
@@ -146,7 +216,7 @@ class QueueProcessor:
                     session_id,
                     context.project_id,
                     context.pipeline_id,
-                    data.get("webhook_data", {})
+                    data.get("webhook_data") or context.webhook_data or {}
                 )
                 
                 # Store analysis result
@@ -166,45 +236,75 @@ class QueueProcessor:
                 # )
                 
         except Exception as e:
-            log.error(f"Pipeline failure analysis failed: {e}")
-            await self.session_manager.update_session_metadata(
-                session_id,
-                {"analysis_error": str(e), "status": "failed"}
-            )
+            await self._finalize_error(session_id, "Pipeline failure analysis", e)
     
-    async def handle_pipeline_success(
-        self,
-        session_id: str,
-        context: Any,
-        data: Dict[str, Any]
-    ):
-        """Handle successful pipeline - store fix in vector DB"""
+    async def _finalize_error(self, session_id: str, label: str, error: Exception):
+        """Log a failed analysis and record it on the session in one write"""
+        error_msg = str(error)
+        # loguru formats messages when keyword arguments are passed, so escape braces
+        # (e.g. from EventLoopException payloads) in the log line only
+        log.error(f"{label} failed: " + error_msg.replace("{", "{{").replace("}", "}}"), exc_info=True)
+        
+        if "prompt is too long" in error_msg:
+            content = "Analysis failed: The pipeline logs are too large to analyze. This typically happens with verbose test output or coverage reports. Please check the GitLab UI directly for the full logs, or consider reducing log verbosity in your CI configuration."
+        else:
+            content = f"Analysis failed: {error_msg}"
+        await self.session_manager.record_analysis_error(session_id, content, error_msg)
+    
+    async def handle_pipeline_success(self, data: Dict[str, Any]):
+        """Settle fix attempts and resolve sessions when a pipeline passes"""
+        project_id = data.get("project_id")
+        ref = data.get("ref")
+        incoming_branch = (ref or "").strip()
+        log.info(f"Processing pipeline success: project={project_id}, ref={incoming_branch}")
+        
         try:
-            # Get the fix that was applied
-            session = await self.session_manager.get_session(session_id)
-            fix_data = session.get("applied_fix")
+            # Check if this is a fix branch that succeeded
+            if incoming_branch.startswith("fix/"):
+                # The pending fix attempt for THIS EXACT branch, matched in the database
+                session = await self.session_manager.get_active_session_with_pending_fix(project_id, incoming_branch)
+                if session:
+                    # This is OUR fix branch that succeeded; locate its webhook_data entry for the UI
+                    ui_attempt_index = next(
+                        (i for i, fa in enumerate(session.get("webhook_data", {}).get("fix_attempts", []))
+                         if fa.get("branch") == incoming_branch),
+                        None
+                    )
+                    
+                    # Record the success, UI status and success message with pipeline URL together
+                    pipeline_url = f"{settings.gitlab_url}/{session.get('project_name')}/-/pipelines"
+                    await self.session_manager.complete_fix_attempt(
+                        session["id"],
+                        session["fix_attempt_number"],
+                        f"✅ **Fix Successful!**\n\n"
+                        f"The pipeline on branch `{ref}` has passed all checks.\n\n"
+                        f"**Next Steps:**\n"
+                        f"1. Review the changes in the merge request\n"
+                        f"2. Merge when ready: {session.get('fix_merge_request_url')}\n"
+                        f"3. The fix will be applied to the target branch after merge\n\n"
+                        f"[View Pipeline]({pipeline_url})",
+                        ui_attempt_index
+                    )
+                    
+                    log.info(f"Marked fix attempt as successful for session {session['id']}")
             
-            if fix_data:
-                # Store successful fix in vector DB
-                # TODO: Store successful fix in vector store
-                # await self.vector_store.store_successful_fix(
-                #     session_id=session_id,
-                #     project_id=context.project_id,
-                #     fix_type="merge_request",
-                #     mr_url=merge_request.get("web_url"),
-                #     error_signature=self._extract_error_signature(session_data)
-                # )
-                
-                log.info(f"Stored successful fix for session {session_id}")
-                
-                # Update session status
-                await self.session_manager.update_session_metadata(
-                    session_id,
-                    {"status": "fixed", "fixed_at": datetime.utcnow()}
-                )
-                
+            # Check if this is target branch after merge
+            else:
+                # Newest session on this target branch with a merged-in successful fix attempt
+                session = await self.session_manager.get_session_ready_to_resolve(project_id, incoming_branch)
+                if session:
+                    await self.session_manager.resolve_with_message(
+                        session["id"],
+                        "assistant",
+                        f"✅ **Issue Fully Resolved!**\n\n"
+                        f"The fix has been merged and the pipeline on `{ref}` branch is passing.\n"
+                        f"The issue has been successfully resolved."
+                    )
+                    log.info(f"Marked session {session['id']} as resolved - target branch succeeded after merge")
+                    self.session_manager.cancel_session_analysis(session["id"])
+                    
         except Exception as e:
-            log.error(f"Failed to store successful fix: {e}")
+            log.error(f"Failed to handle pipeline success: {e}")
     
     async def analyze_quality_issues(
         self,
@@ -216,72 +316,62 @@ class QueueProcessor:
         try:
             project_key = context.sonarqube_key or f"{context.project_name}"
             gitlab_project_id = context.project_id
-            webhook_data = data.get("webhook_data", {})
+            # Pipeline events reference the payload stored on the session row
+            webhook_data = data.get("webhook_data") or context.webhook_data or {}
             
             log.info(f"Processing quality failure for project {project_key}, session {session_id}")
             
             # Following working version: fetch SonarQube data first, then provide to agent
             try:
-                from tools.sonarqube import get_project_issues, get_project_metrics, get_project_quality_gate_status
-                
-                # Get quality gate status
-                quality_status = await get_project_quality_gate_status(project_key)
+                if project_key in projects_without_quality_gate:
+                    # Probed recently and had no gate; skip SonarQube until the entry expires
+                    project_status = {}
+                else:
+                    # Fetch quality gate status alongside the shared (cached) counts and metrics
+                    quality_status, bundle = await asyncio.gather(
+                        get_project_quality_gate_status(project_key),
+                        fetch_quality_bundle(project_key, sonar_analysis_id(webhook_data)),
+                        return_exceptions=True
+                    )
+                    if isinstance(quality_status, BaseException):
+                        raise quality_status
+                    project_status = quality_status.get("projectStatus", {})
+                    if project_status.get("status") == "NONE" or not project_status:
+                        # Remember only real probe results, so a hit never extends the entry
+                        projects_without_quality_gate[project_key] = True
                 
                 # Check if there are actual quality issues or just no analysis
-                project_status = quality_status.get("projectStatus", {})
                 if project_status.get("status") == "NONE" or not project_status:
                     log.warning(f"No quality gate configured or no analysis for {project_key}")
                     result = f"## ⚠️ SonarQube Analysis Issue\n\nNo SonarQube analysis results found for project '{project_key}'. This appears to be a pipeline configuration issue, not a code quality issue."
                 else:
-                    # Get issue counts by type
-                    bugs = await get_project_issues(project_key, types="BUG", limit=500)
-                    vulnerabilities = await get_project_issues(project_key, types="VULNERABILITY", limit=500) 
-                    code_smells = await get_project_issues(project_key, types="CODE_SMELL", limit=500)
-                    
-                    # Get project metrics
-                    try:
-                        metrics = await get_project_metrics(project_key)
-                    except Exception as e:
-                        log.warning(f"Could not fetch metrics for {project_key}: {e}")
-                        metrics = {}
+                    # Issue counts come from facets, not issue listings
+                    if isinstance(bundle, BaseException):
+                        raise bundle
+                    counts, metrics = bundle
+                    total_issues = counts["total_issues"]
                     
-                    # Calculate counts
-                    total_issues = len(bugs) + len(vulnerabilities) + len(code_smells)
-                    critical_count = sum(1 for b in bugs if b.get("severity") in ["CRITICAL", "BLOCKER"])
-                    critical_count += sum(1 for v in vulnerabilities if v.get("severity") in ["CRITICAL", "BLOCKER"])
-                    major_count = sum(1 for b in bugs if b.get("severity") == "MAJOR")
-                    major_count += sum(1 for v in vulnerabilities if v.get("severity") == "MAJOR")
+                    # Update session with quality metrics (temporarily disabled due to schema)
+                    # TODO: Add quality metrics columns to sessions table
+                    # await self.session_manager.update_quality_metrics(
+                    #     session_id,
+                    #     {
+                    #         **counts,
+                    #         "coverage": metrics.get("coverage", "0"),
+                    #         "duplicated_lines_density": metrics.get("duplicated_lines_density", "0"),
+                    #         "reliability_rating": metrics.get("reliability_rating", "E"),
+                    #         "security_rating": metrics.get("security_rating", "E"),
+                    #         "maintainability_rating": metrics.get("maintainability_rating", "E")
+                    #     }
+                    # )
                     
-                    # Update session with quality metrics (like working version)
-        # Update session with quality metrics (temporarily disabled due to schema)
-        # TODO: Add quality metrics columns to sessions table
-        # await self._session_manager.update_quality_metrics(
-        #     session_id,
-        #     {
-        #         "total_issues": total_issues,
-        #         "bug_count": len(bugs),
-        #         "vulnerability_count": len(vulnerabilities),
-        #         "code_smell_count": len(code_smells),
-        #         "critical_issues": critical_count,
-        #         "major_issues": major_count,
-        #         "coverage": metrics.get("coverage", "0"),
-        #         "duplicated_lines_density": metrics.get("duplicated_lines_density", "0"),
-        #         "reliability_rating": metrics.get("reliability_rating", "E"),
-        #         "security_rating": metrics.get("security_rating", "E"),
-        #         "maintainability_rating": metrics.get("maintainability_rating", "E")
-        #     }
-        # )                    # Prepare enhanced webhook data with quality information (like working version)
+                    # Prepare enhanced webhook data with quality information (like working version)
                     enhanced_webhook_data = {
                         **webhook_data,
                         "qualityGate": project_status,
                         "sonarqube_data": {
-                            "bugs": bugs,
-                            "vulnerabilities": vulnerabilities,
-                            "code_smells": code_smells,
-                            "metrics": metrics,
-                            "total_issues": total_issues,
-                            "critical_issues": critical_count,
-                            "major_issues": major_count
+                            **counts,
+                            "metrics": metrics
                         }
                     }
                     
@@ -323,11 +413,7 @@ class QueueProcessor:
             # )
             
         except Exception as e:
-            log.error(f"Quality analysis failed: {e}")
-            await self.session_manager.update_session_metadata(
-                session_id,
-                {"analysis_error": str(e), "status": "failed"}
-            )
+            await self._finalize_error(session_id, "Quality analysis", e)
     
     async def analyze_quality_from_pipeline(
         self,
@@ -342,25 +428,24 @@ class QueueProcessor:
     async def check_quality_gate_in_logs(self, context: Any) -> bool:
         """Check if quality gate failed in pipeline logs"""
         try:
-            # Get pipeline logs
-            logs = await self.pipeline_agent.get_pipeline_logs(
-                context.project_id,
-                context.pipeline_id
-            )
+            jobs = await get_pipeline_jobs(context.pipeline_id, context.project_id)
             
-            # Check for quality gate failure indicators
-            quality_indicators = [
-                "Quality Gate failed",
-                "SonarQube analysis failed",
-                "Code coverage below threshold",
-                "Too many code smells",
-                "Security hotspots detected"
-            ]
+            # Stream each failed job's log and stop at the first indicator
+            for job in jobs:
+                if job.get('status') != 'failed':
+                    continue
+                tail = ""
+                try:
+                    async with contextlib.aclosing(iter_job_logs(job['id'], context.project_id)) as chunks:
+                        async for chunk in chunks:
+                            window = tail + chunk
+                            if _QUALITY_GATE_RE.search(window):
+                                return True
+                            tail = window[-_QUALITY_GATE_OVERLAP:]
+                except Exception as e:
+                    # An unreadable trace (e.g. erased) should not hide the other jobs
+                    log.warning(f"Could not read log for job {job['id']}: {e}")
             
-            for indicator in quality_indicators:
-                if indicator.lower() in logs.lower():
-                    return True
-                    
             return False
             
         except Exception as e:
@@ -399,29 +484,29 @@ class QueueProcessor:
             
             # Handle different merge request actions
             if mr_action == "merge":
-                await self._handle_merge_request_merged(session_id, context, data)
+                self._handle_merge_request_merged(session_id, context, data)
             elif mr_action == "close":
-                await self._handle_merge_request_closed(session_id, context, data)
+                self._handle_merge_request_closed(session_id, context, data)
             elif mr_action in ["open", "update"]:
-                await self._handle_merge_request_opened_updated(session_id, context, data)
+                self._handle_merge_request_opened_updated(session_id, context, data)
             else:
                 log.info(f"MR action '{mr_action}' not requiring special handling")
                 
         except Exception as e:
             log.error(f"Error handling MR event: {e}")
     
-    async def _handle_merge_request_merged(self, session_id: str, context: Any, data: Dict[str, Any]):
+    def _handle_merge_request_merged(self, session_id: str, context: Any, data: Dict[str, Any]):
         """Handle when a merge request is merged"""
         log.info(f"MR merged - checking if this resolves any active sessions")
         
         # This could be used to mark sessions as resolved when fixes are merged
         # Implementation would depend on how we track which MRs belong to which sessions
         
-    async def _handle_merge_request_closed(self, session_id: str, context: Any, data: Dict[str, Any]):
+    def _handle_merge_request_closed(self, session_id: str, context: Any, data: Dict[str, Any]):
         """Handle when a merge request is closed without merging"""
         log.info(f"MR closed without merging")
         
-    async def _handle_merge_request_opened_updated(self, session_id: str, context: Any, data: Dict[str, Any]):
+    def _handle_merge_request_opened_updated(self, session_id: str, context: Any, data: Dict[str, Any]):
         """Handle when a merge request is opened or updated"""
         log.info(f"MR opened/updated - tracking for session correlation")
     
@@ -1,6 +1,6 @@
 """Abstracted Vector Store - Switches between local OpenSearch and AWS OpenSearch"""
 from typing import Dict, Any, List, Optional
-from datetime import datetime
+from datetime import datetime, timezone
 import hashlib
 from sentence_transformers import SentenceTransformer
 from opensearchpy import OpenSearch, RequestsHttpConnection
@@ -121,7 +121,7 @@ class VectorStoreService:
                 "fix_content": fix_files,
                 "project_id": session_data.get("project_id"),
                 "success_rate": 1.0,
-                "created_at": datetime.utcnow().isoformat()
+                "created_at": datetime.now(timezone.utc).isoformat()
             }
             
             self.client.index(
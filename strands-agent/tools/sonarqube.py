@@ -1,23 +1,43 @@
 """SonarQube tools for quality analysis"""
 import httpx
 import base64
-from typing import Dict, Any, List, Optional
+import asyncio
+from typing import Dict, Any, List, Optional, Callable, Awaitable
 from strands import tool
+from cachetools import TTLCache
 from utils.logger import log
 from config import settings
 
-async def get_sonar_client():
-    """Create SonarQube API client"""
-    auth_header = {}
-    if settings.sonarqube_token:
-        credentials = base64.b64encode(f"{settings.sonarqube_token}:".encode()).decode()
-        auth_header = {"Authorization": f"Basic {credentials}"}
-    
-    return httpx.AsyncClient(
-        base_url=f"{settings.sonarqube_url}/api",
-        headers=auth_header,
-        timeout=30.0
-    )
+# Severity groups used when tallying issues
+CRITICAL_SEVERITIES = frozenset(("CRITICAL", "BLOCKER"))
+MAJOR_SEVERITIES = frozenset(("MAJOR",))
+
+# Process-wide client so every SonarQube call reuses pooled keep-alive connections
+_shared_sonar_client: Optional[httpx.AsyncClient] = None
+
+async def get_shared_sonar_client() -> httpx.AsyncClient:
+    """Get the shared SonarQube API client (do not close it; see close_sonar_client)"""
+    global _shared_sonar_client
+    if _shared_sonar_client is None or _shared_sonar_client.is_closed:
+        auth_header = {}
+        if settings.sonarqube_token:
+            credentials = base64.b64encode(f"{settings.sonarqube_token}:".encode()).decode()
+            auth_header = {"Authorization": f"Basic {credentials}"}
+        
+        _shared_sonar_client = httpx.AsyncClient(
+            base_url=f"{settings.sonarqube_url}/api",
+            headers=auth_header,
+            timeout=30.0,
+            limits=httpx.Limits(max_keepalive_connections=20)
+        )
+    return _shared_sonar_client
+
+async def close_sonar_client():
+    """Close the shared SonarQube API client on shutdown"""
+    global _shared_sonar_client
+    if _shared_sonar_client is not None:
+        await _shared_sonar_client.aclose()
+        _shared_sonar_client = None
 
 @tool
 async def get_project_quality_gate_status(project_key: str) -> Dict[str, Any]:
@@ -31,17 +51,17 @@ async def get_project_quality_gate_status(project_key: str) -> Dict[str, Any]:
     """
     log.info(f"Getting quality gate status for {project_key}")
     
-    async with await get_sonar_client() as client:
-        try:
-            response = await client.get(
-                "/qualitygates/project_status",
-                params={"projectKey": project_key}
-            )
-            response.raise_for_status()
-            return response.json()
-        except Exception as e:
-            log.error(f"Failed to get quality gate status: {e}")
-            return {"error": str(e)}
+    client = await get_shared_sonar_client()
+    try:
+        response = await client.get(
+            "/qualitygates/project_status",
+            params={"projectKey": project_key}
+        )
+        response.raise_for_status()
+        return response.json()
+    except Exception as e:
+        log.error(f"Failed to get quality gate status: {e}")
+        return {"error": str(e)}
 
 @tool
 async def get_project_issues(
@@ -63,40 +83,116 @@ async def get_project_issues(
     """
     log.info(f"Getting issues for {project_key} (types={types}, severities={severities})")
     
-    async with await get_sonar_client() as client:
-        try:
-            params = {
-                "componentKeys": project_key,
-                "ps": limit,
-                "resolved": "false"
+    client = await get_shared_sonar_client()
+    try:
+        params = {
+            "componentKeys": project_key,
+            "ps": limit,
+            "resolved": "false"
+        }
+        if types:
+            params["types"] = types
+        if severities:
+            params["severities"] = severities
+        
+        response = await client.get("/issues/search", params=params)
+        response.raise_for_status()
+        
+        issues = response.json().get("issues", [])
+        log.debug(f"Found {len(issues)} issues")
+        
+        # Simplify response
+        return [{
+            "key": issue.get("key"),
+            "type": issue.get("type"),
+            "severity": issue.get("severity"),
+            "message": issue.get("message"),
+            "component": issue.get("component"),
+            "line": issue.get("line"),
+            "effort": issue.get("effort"),
+            "rule": issue.get("rule"),
+            "file": issue.get("component", "").split(":")[-1] if ":" in issue.get("component", "") else issue.get("component")
+        } for issue in issues]
+        
+    except Exception as e:
+        log.error(f"Failed to get project issues: {e}")
+        return []
+
+async def get_project_issue_facets(
+    project_key: str,
+    facets: str,
+    types: Optional[str] = None
+) -> Dict[str, Dict[str, int]]:
+    """Get unresolved issue counts for a project grouped by facet
+    
+    Only the facet aggregates are requested (one issue per page), not the
+    issue bodies.
+    
+    Args:
+        project_key: SonarQube project key
+        facets: Comma-separated facets (e.g. types,severities)
+        types: Optional comma-separated issue types to restrict the counts to
+    
+    Returns:
+        Mapping of facet name to {value: count}
+    """
+    log.info(f"Getting issue facets for {project_key} (facets={facets}, types={types})")
+    
+    client = await get_shared_sonar_client()
+    try:
+        params = {
+            "componentKeys": project_key,
+            "ps": 1,
+            "resolved": "false",
+            "facets": facets
+        }
+        if types:
+            params["types"] = types
+        
+        response = await client.get("/issues/search", params=params)
+        response.raise_for_status()
+        
+        return {
+            facet.get("property"): {
+                value.get("val"): value.get("count", 0)
+                for value in facet.get("values", [])
             }
-            if types:
-                params["types"] = types
-            if severities:
-                params["severities"] = severities
-            
-            response = await client.get("/issues/search", params=params)
-            response.raise_for_status()
-            
-            issues = response.json().get("issues", [])
-            log.debug(f"Found {len(issues)} issues")
-            
-            # Simplify response
-            return [{
-                "key": issue.get("key"),
-                "type": issue.get("type"),
-                "severity": issue.get("severity"),
-                "message": issue.get("message"),
-                "component": issue.get("component"),
-                "line": issue.get("line"),
-                "effort": issue.get("effort"),
-                "rule": issue.get("rule"),
-                "file": issue.get("component", "").split(":")[-1] if ":" in issue.get("component", "") else issue.get("component")
-            } for issue in issues]
-            
-        except Exception as e:
-            log.error(f"Failed to get project issues: {e}")
-            return []
+            for facet in response.json().get("facets", [])
+        }
+        
+    except Exception as e:
+        log.error(f"Failed to get issue facets: {e}")
+        return {}
+
+async def get_project_issue_counts(project_key: str) -> Dict[str, int]:
+    """Get unresolved issue counts for a project without listing the issues
+    
+    Issue types are counted across the project; critical and major counts
+    cover bugs and vulnerabilities, matching the quality gate summary.
+    
+    Args:
+        project_key: SonarQube project key
+    
+    Returns:
+        total_issues, bug_count, vulnerability_count, code_smell_count,
+        critical_issues and major_issues
+    """
+    type_facets, severity_facets = await asyncio.gather(
+        get_project_issue_facets(project_key, "types"),
+        get_project_issue_facets(project_key, "severities", types="BUG,VULNERABILITY")
+    )
+    types = type_facets.get("types", {})
+    severities = severity_facets.get("severities", {})
+    
+    counts = {
+        "bug_count": types.get("BUG", 0),
+        "vulnerability_count": types.get("VULNERABILITY", 0),
+        "code_smell_count": types.get("CODE_SMELL", 0),
+        "critical_issues": sum(severities.get(severity, 0) for severity in CRITICAL_SEVERITIES),
+        "major_issues": sum(severities.get(severity, 0) for severity in MAJOR_SEVERITIES)
+    }
+    counts["total_issues"] = counts["bug_count"] + counts["vulnerability_count"] + counts["code_smell_count"]
+    return counts
 
 @tool
 async def get_project_metrics(project_key: str) -> Dict[str, Any]:
@@ -110,34 +206,34 @@ async def get_project_metrics(project_key: str) -> Dict[str, Any]:
     """
     log.info(f"Getting metrics for {project_key}")
     
-    async with await get_sonar_client() as client:
-        try:
-            response = await client.get(
-                "/measures/component",
-                params={
-                    "component": project_key,
-                    "metricKeys": "bugs,vulnerabilities,code_smells,coverage,duplicated_lines_density,reliability_rating,security_rating,sqale_rating,ncloc"
-                }
-            )
-            response.raise_for_status()
-            
-            measures = response.json().get("component", {}).get("measures", [])
-            
-            # Convert to dict for easier access
-            metrics = {}
-            for measure in measures:
-                metric_key = measure["metric"]
-                # Map sqale_rating to maintainability_rating
-                if metric_key == "sqale_rating":
-                    metrics["maintainability_rating"] = measure.get("value", "E")
-                else:
-                    metrics[metric_key] = measure.get("value", measure.get("periods", [{}])[0].get("value", "N/A"))
-            
-            return metrics
-            
-        except Exception as e:
-            log.error(f"Failed to get project metrics: {e}")
-            return {"error": str(e)}
+    client = await get_shared_sonar_client()
+    try:
+        response = await client.get(
+            "/measures/component",
+            params={
+                "component": project_key,
+                "metricKeys": "bugs,vulnerabilities,code_smells,coverage,duplicated_lines_density,reliability_rating,security_rating,sqale_rating,ncloc"
+            }
+        )
+        response.raise_for_status()
+        
+        measures = response.json().get("component", {}).get("measures", [])
+        
+        # Convert to dict for easier access
+        metrics = {}
+        for measure in measures:
+            metric_key = measure["metric"]
+            # Map sqale_rating to maintainability_rating
+            if metric_key == "sqale_rating":
+                metrics["maintainability_rating"] = measure.get("value", "E")
+            else:
+                metrics[metric_key] = measure.get("value", measure.get("periods", [{}])[0].get("value", "N/A"))
+        
+        return metrics
+        
+    except Exception as e:
+        log.error(f"Failed to get project metrics: {e}")
+        return {"error": str(e)}
 
 @tool
 async def get_issue_details(issue_key: str) -> Dict[str, Any]:
@@ -151,22 +247,22 @@ async def get_issue_details(issue_key: str) -> Dict[str, Any]:
     """
     log.info(f"Getting details for issue {issue_key}")
     
-    async with await get_sonar_client() as client:
-        try:
-            response = await client.get(
-                "/issues/search",
-                params={"issues": issue_key}
-            )
-            response.raise_for_status()
-            
-            issues = response.json().get("issues", [])
-            if issues:
-                return issues[0]
-            return {"error": "Issue not found"}
-            
-        except Exception as e:
-            log.error(f"Failed to get issue details: {e}")
-            return {"error": str(e)}
+    client = await get_shared_sonar_client()
+    try:
+        response = await client.get(
+            "/issues/search",
+            params={"issues": issue_key}
+        )
+        response.raise_for_status()
+        
+        issues = response.json().get("issues", [])
+        if issues:
+            return issues[0]
+        return {"error": "Issue not found"}
+        
+    except Exception as e:
+        log.error(f"Failed to get issue details: {e}")
+        return {"error": str(e)}
 
 @tool
 async def get_rule_description(rule_key: str) -> Dict[str, Any]:
@@ -180,24 +276,78 @@ async def get_rule_description(rule_key: str) -> Dict[str, Any]:
     """
     log.info(f"Getting rule description for {rule_key}")
     
-    async with await get_sonar_client() as client:
-        try:
-            response = await client.get(
-                "/rules/show",
-                params={"key": rule_key}
-            )
-            response.raise_for_status()
-            
-            rule = response.json().get("rule", {})
-            return {
-                "key": rule.get("key"),
-                "name": rule.get("name"),
-                "severity": rule.get("severity"),
-                "type": rule.get("type"),
-                "description": rule.get("htmlDesc", ""),
-                "remediation": rule.get("remFnBaseEffort", "")
-            }
-            
-        except Exception as e:
-            log.error(f"Failed to get rule description: {e}")
-            return {"error": str(e)}
\ No newline at end of file
+    client = await get_shared_sonar_client()
+    try:
+        response = await client.get(
+            "/rules/show",
+            params={"key": rule_key}
+        )
+        response.raise_for_status()
+        
+        rule = response.json().get("rule", {})
+        return {
+            "key": rule.get("key"),
+            "name": rule.get("name"),
+            "severity": rule.get("severity"),
+            "type": rule.get("type"),
+            "description": rule.get("htmlDesc", ""),
+            "remediation": rule.get("remFnBaseEffort", "")
+        }
+        
+    except Exception as e:
+        log.error(f"Failed to get rule description: {e}")
+        return {"error": str(e)}
+
+# SonarQube results only change when a new analysis is published. Cache them
+# briefly per analysis so retried events for the same pipeline share one set
+# of requests. Entries hold the fetch task, so
+# concurrent callers for the same key wait on a single request.
+SONAR_CACHE_TTL_SECONDS = 60
+_sonar_cache: TTLCache = TTLCache(maxsize=1024, ttl=SONAR_CACHE_TTL_SECONDS)
+
+def _cached_sonar_fetch(key: tuple, fetch: Callable[[], Awaitable[Any]]) -> Awaitable[Any]:
+    """Return the cached fetch for key, starting a new one if missing or failed"""
+    task = _sonar_cache.get(key)
+    if task is None or (task.done() and (task.cancelled() or task.exception() is not None)):
+        task = asyncio.ensure_future(fetch())
+        _sonar_cache[key] = task
+    # Shield so a cancelled caller does not cancel the fetch for the others
+    return asyncio.shield(task)
+
+# Projects whose quality gate probe recently came back NONE (no analysis or
+# no gate configured); repeat webhooks for them skip the SonarQube probe.
+NO_QUALITY_GATE_TTL_SECONDS = 300
+projects_without_quality_gate: TTLCache = TTLCache(maxsize=1024, ttl=NO_QUALITY_GATE_TTL_SECONDS)
+
+def sonar_analysis_id(webhook_data: Dict) -> Optional[str]:
+    """Identify the analysis an event refers to (SonarQube task or GitLab commit)"""
+    return webhook_data.get("taskId") or webhook_data.get("object_attributes", {}).get("sha")
+
+def _cached_issue_counts(project_key: str, analysis_id: Optional[str]) -> Awaitable[Any]:
+    return _cached_sonar_fetch(
+        ("issue_counts", project_key, analysis_id),
+        lambda: get_project_issue_counts(project_key)
+    )
+
+def _cached_metrics(project_key: str, analysis_id: Optional[str]) -> Awaitable[Any]:
+    return _cached_sonar_fetch(
+        ("metrics", project_key, analysis_id),
+        lambda: get_project_metrics(project_key)
+    )
+
+async def fetch_quality_bundle(project_key: str, analysis_id: Optional[str]):
+    """Fetch issue counts and project metrics concurrently
+    
+    Metrics are optional: a failed metrics fetch is logged and returned as {}.
+    """
+    counts, metrics = await asyncio.gather(
+        _cached_issue_counts(project_key, analysis_id),
+        _cached_metrics(project_key, analysis_id),
+        return_exceptions=True
+    )
+    if isinstance(counts, BaseException):
+        raise counts
+    if isinstance(metrics, BaseException):
+        log.warning(f"Could not fetch metrics for {project_key}: {metrics}")
+        metrics = {}
+    return counts, metrics
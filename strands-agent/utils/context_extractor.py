@@ -2,8 +2,39 @@
 from typing import Dict, Any, Optional, List
 from datetime import datetime
 import json
+import re
+from strands import tool
 from utils.logger import log
 
+# Failure type keywords matched against job names, checked in priority order
+_FAILURE_TYPE_PATTERNS = tuple(
+    (failure_type, re.compile("|".join(keywords), re.IGNORECASE))
+    for failure_type, keywords in (
+        ("test", ("test", "spec", "unit")),
+        ("build", ("build", "compile")),
+        ("deployment", ("deploy",)),
+        ("quality", ("sonar", "quality", "lint")),
+        ("security", ("security", "scan")),
+    )
+)
+
+# Constant prompt blocks, joined once at import instead of appended per call
+_PIPELINE_INSTRUCTIONS = "\n".join([
+    "\n## 🔍 Analysis Instructions",
+    "Use the above context to:",
+    "1. **Retrieve logs** for the failed job(s) using the Job IDs provided",
+    "2. **Examine relevant files** in the project repository",
+    "3. **Analyze the failure patterns** based on the job names and stages",
+    "4. **Provide specific solutions** targeting the identified failure types"
+])
+
+_QUALITY_INSTRUCTIONS_TAIL = "\n".join([
+    "2. **Analyze quality metrics** and identify the most critical issues",
+    "3. **Examine affected files** and understand the code quality problems",
+    "4. **Prioritize fixes** based on severity and impact",
+    "5. **Provide comprehensive solutions** to improve code quality"
+])
+
 
 class ContextExtractor:
     """Extracts and formats essential context information for LLM agents"""
@@ -38,15 +69,20 @@ class ContextExtractor:
                 "finished_at": pipeline.get("finished_at", ""),
             })
             
-            # Extract failed jobs information
-            failed_jobs = [job for job in builds if job.get("status") == "failed"]
-            passed_jobs = [job for job in builds if job.get("status") == "success"]
+            # Split failed jobs, count passed ones and track the most recent failure in one pass
+            failed_jobs = []
+            passed_job_count = 0
+            most_recent_failed = None
+            for job in builds:
+                status = job.get("status")
+                if status == "success":
+                    passed_job_count += 1
+                elif status == "failed":
+                    failed_jobs.append(job)
+                    if most_recent_failed is None or (job.get("finished_at") or "") > (most_recent_failed.get("finished_at") or ""):
+                        most_recent_failed = job
             
             if failed_jobs:
-                # Sort by finished_at to get the most recent failure
-                failed_jobs.sort(key=lambda x: x.get("finished_at", ""), reverse=True)
-                most_recent_failed = failed_jobs[0]
-                
                 context.update({
                     "failed_job_count": len(failed_jobs),
                     "most_recent_failed_job": {
@@ -71,26 +107,18 @@ class ContextExtractor:
                 })
             
             context.update({
-                "passed_job_count": len(passed_jobs),
+                "passed_job_count": passed_job_count,
                 "total_job_count": len(builds)
             })
             
             # Determine failure type based on job names
             failure_types = []
             for job in failed_jobs:
-                job_name = job.get("name", "").lower()
-                if any(keyword in job_name for keyword in ["test", "spec", "unit"]):
-                    failure_types.append("test")
-                elif any(keyword in job_name for keyword in ["build", "compile"]):
-                    failure_types.append("build")
-                elif any(keyword in job_name for keyword in ["deploy", "deployment"]):
-                    failure_types.append("deployment")
-                elif any(keyword in job_name for keyword in ["sonar", "quality", "lint"]):
-                    failure_types.append("quality")
-                elif any(keyword in job_name for keyword in ["security", "scan"]):
-                    failure_types.append("security")
-                else:
-                    failure_types.append("other")
+                job_name = job.get("name") or ""
+                failure_types.append(next(
+                    (failure_type for failure_type, pattern in _FAILURE_TYPE_PATTERNS if pattern.search(job_name)),
+                    "other"
+                ))
             
             context["likely_failure_types"] = list(set(failure_types))
             
@@ -230,16 +258,13 @@ class ContextExtractor:
         # All Failed Jobs List
         if context.get('all_failed_jobs') and len(context.get('all_failed_jobs', [])) > 1:
             sections.append("\n## 📝 All Failed Jobs")
-            for i, job in enumerate(context.get('all_failed_jobs', []), 1):
-                sections.append(f"{i}. **{job.get('name')}** (ID: {job.get('id')}) - Stage: {job.get('stage')}")
+            sections.extend(
+                f"{i}. **{job.get('name')}** (ID: {job.get('id')}) - Stage: {job.get('stage')}"
+                for i, job in enumerate(context.get('all_failed_jobs', []), 1)
+            )
         
         # Analysis Instructions
-        sections.append("\n## 🔍 Analysis Instructions")
-        sections.append("Use the above context to:")
-        sections.append("1. **Retrieve logs** for the failed job(s) using the Job IDs provided")
-        sections.append("2. **Examine relevant files** in the project repository")
-        sections.append("3. **Analyze the failure patterns** based on the job names and stages")
-        sections.append("4. **Provide specific solutions** targeting the identified failure types")
+        sections.append(_PIPELINE_INSTRUCTIONS)
         
         return "\n".join(sections)
     
@@ -273,8 +298,10 @@ class ContextExtractor:
             # Failed Conditions
             if context.get('quality_gate_conditions'):
                 sections.append("\n### ❌ Failed Conditions")
-                for i, condition in enumerate(context.get('quality_gate_conditions', []), 1):
-                    sections.append(f"{i}. **{condition.get('metric')}**: {condition.get('actual_value')} {condition.get('operator')} {condition.get('threshold')}")
+                sections.extend(
+                    f"{i}. **{condition.get('metric')}**: {condition.get('actual_value')} {condition.get('operator')} {condition.get('threshold')}"
+                    for i, condition in enumerate(context.get('quality_gate_conditions', []), 1)
+                )
         
         # SonarQube Analysis Data
         if context.get('sonarqube_analysis'):
@@ -305,10 +332,7 @@ class ContextExtractor:
         else:
             sections.append("1. **Retrieve SonarQube project** information and detailed issues")
         
-        sections.append("2. **Analyze quality metrics** and identify the most critical issues")
-        sections.append("3. **Examine affected files** and understand the code quality problems")
-        sections.append("4. **Prioritize fixes** based on severity and impact")
-        sections.append("5. **Provide comprehensive solutions** to improve code quality")
+        sections.append(_QUALITY_INSTRUCTIONS_TAIL)
         
         return "\n".join(sections)
     
@@ -370,8 +394,6 @@ class ContextExtractor:
     @staticmethod
     def create_context_tool(session_id: str, webhook_data: Dict[str, Any], agent_type: str):
         """Create a tool that provides formatted context to the agent"""
-        from strands import tool
-        
         # Extract context once
         if agent_type == "pipeline":
             context = ContextExtractor.extract_pipeline_context(webhook_data)
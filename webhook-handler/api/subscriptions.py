@@ -10,6 +10,7 @@ from config import settings
 from services.webhook_manager import WebhookManager
 from db.database import Database
 from services.auth import get_api_key, get_optional_api_key
+from api.webhooks import invalidate_subscription_secret
 
 router = APIRouter(tags=["subscriptions"])
 
@@ -197,6 +198,7 @@ async def delete_subscription(
         
         # Mark subscription as deleted
         await db.update_subscription(subscription_id, {"status": "deleted"})
+        invalidate_subscription_secret(subscription["project_id"], subscription["project_type"])
         
         log.info(f"Deleted subscription {subscription_id}")
         return {"message": "Subscription deleted successfully"}
@@ -250,6 +252,7 @@ async def refresh_subscription(
             "status": "active" if active else "inactive",
             "last_refreshed": datetime.utcnow()
         })
+        invalidate_subscription_secret(subscription["project_id"], subscription["project_type"])
         
         return {
             "subscription_id": subscription_id,
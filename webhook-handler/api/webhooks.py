@@ -1,11 +1,15 @@
 """Simplified Webhook API - Just receives and forwards to queue"""
 from fastapi import APIRouter, Request, HTTPException, Header, Depends
-from typing import Dict, Any, Optional
-import json
+from fastapi.responses import ORJSONResponse
+from typing import Dict, Any, Optional, Set
+import asyncio
+import contextvars
+import re
 import uuid
 import hmac
-import hashlib
-from datetime import datetime, timedelta
+import orjson
+from cachetools import TTLCache
+from datetime import datetime, timedelta, timezone
 from services.queue_publisher import QueuePublisher
 from db.database import Database
 from utils.logger import log
@@ -13,31 +17,98 @@ from config import settings
 
 router = APIRouter(tags=["webhooks"])
 
-async def detect_quality_failure_from_pipeline(data: Dict[str, Any]) -> bool:
-    """Detect if pipeline failure is due to quality gate failure"""
-    failed_jobs = [job for job in data.get("builds", []) if job.get("status") == "failed"]
-    
-    if not failed_jobs:
-        return False
-    
-    # Sort by finished_at to get the most recent failure
-    failed_jobs.sort(key=lambda x: x.get("finished_at", ""), reverse=True)
-    most_recent_failed_job = failed_jobs[0]
-    
-    job_name = most_recent_failed_job.get("name", "").lower()
+# Global fallback secrets are encoded once at import; comparisons run on bytes
+_GITLAB_WEBHOOK_SECRET = settings.gitlab_webhook_secret.encode()
+_SONARQUBE_WEBHOOK_SECRET = settings.sonarqube_webhook_secret.encode()
+
+# Subscription secrets rarely change; cache the encoded secret per project
+# so authenticated webhooks skip the subscription lookup. Bounded so a
+# long-running worker does not grow without limit.
+SUBSCRIPTION_SECRET_TTL_SECONDS = 300
+_subscription_secret_cache: TTLCache = TTLCache(maxsize=10_000, ttl=SUBSCRIPTION_SECRET_TTL_SECONDS)
+
+def _secret_matches(supplied: str, expected: bytes) -> bool:
+    """Constant-time comparison of a header secret against an encoded secret"""
+    return hmac.compare_digest(supplied.encode(), expected)
+
+async def get_subscription_secret(db: Database, project_id: str, project_type: str) -> Optional[bytes]:
+    """Get the encoded webhook secret of the active subscription for a project"""
+    cache_key = (project_id, project_type)
+    cached = _subscription_secret_cache.get(cache_key)
+    if cached:
+        return cached
     
-    # Check if it's a quality/sonar related job
-    quality_keywords = ['sonar', 'quality', 'scan', 'analysis', 'gate']
-    if any(keyword in job_name for keyword in quality_keywords):
-        log.info(f"Detected quality failure from job name: {job_name}")
-        return True
+    subscription = await db.find_subscription_by_project(
+        project_id=project_id,
+        project_type=project_type,
+        status="active"
+    )
+    if not subscription or not subscription.get("webhook_secret"):
+        log.warning("{} auth: No active subscription secret for project {}", project_type, project_id)
+        return None
     
-    # Could also check job logs here if needed, but for now use job name detection
-    return False
+    secret = subscription["webhook_secret"].encode()
+    _subscription_secret_cache[cache_key] = secret
+    return secret
+
+def invalidate_subscription_secret(project_id: str, project_type: str):
+    """Drop a cached subscription secret (call when a subscription changes)"""
+    _subscription_secret_cache.pop((project_id, project_type), None)
 
 # Global instances - will be initialized in main.py lifespan
 queue_publisher = None
 
+# Accepted webhook work (session storage, queue publishing) waits here for a
+# fixed pool of workers, so a burst is absorbed without unbounded tasks and
+# a full queue pushes back on the sender instead of on the database
+_ingest_queue: Optional[asyncio.Queue] = None
+_ingest_workers: Set[asyncio.Task] = set()
+
+async def _ingest_worker():
+    """Run queued ingestion jobs one at a time"""
+    while True:
+        job = await _ingest_queue.get()
+        try:
+            await job
+        except Exception as e:
+            log.error("Webhook ingestion job failed: {}", e, exc_info=True)
+        finally:
+            _ingest_queue.task_done()
+
+def start_ingest_workers():
+    """Create the ingestion queue and its worker pool (called from the app lifespan)"""
+    global _ingest_queue
+    _ingest_queue = asyncio.Queue(maxsize=settings.ingest_queue_size)
+    for _ in range(settings.ingest_workers):
+        # Workers use nothing from the caller's context variables
+        _ingest_workers.add(asyncio.create_task(_ingest_worker(), context=contextvars.Context()))
+    log.info("Started {} webhook ingestion workers", settings.ingest_workers)
+
+async def stop_ingest_workers(drain_timeout: float = 10.0):
+    """Finish accepted ingestion jobs (up to drain_timeout), then stop the workers"""
+    if _ingest_queue is None:
+        return
+    try:
+        await asyncio.wait_for(_ingest_queue.join(), timeout=drain_timeout)
+    except asyncio.TimeoutError:
+        log.warning("Dropping {} queued webhook jobs at shutdown", _ingest_queue.qsize())
+    for worker in _ingest_workers:
+        worker.cancel()
+    await asyncio.gather(*_ingest_workers, return_exceptions=True)
+    _ingest_workers.clear()
+    while not _ingest_queue.empty():
+        _ingest_queue.get_nowait().close()
+
+def _enqueue(job):
+    """Queue an ingestion coroutine for the worker pool, or reject when saturated"""
+    try:
+        _ingest_queue.put_nowait(job)
+    except asyncio.QueueFull:
+        job.close()
+        raise HTTPException(status_code=503, detail="Webhook ingestion queue is full, retry later")
+
+_uuid4 = uuid.uuid4
+
 def get_queue_publisher():
     """Get or create queue publisher"""
     global queue_publisher
@@ -62,177 +133,218 @@ async def verify_webhook_auth(
     if not settings.webhook_auth_enabled:
         return True
     
-    log.info(f"Webhook auth check: gitlab_token={'present' if x_gitlab_token else 'missing'}, sonar_secret={'present' if x_sonarqube_webhook_secret else 'missing'}")
+    log.info("Webhook auth check: gitlab_token={}, sonar_secret={}", 'present' if x_gitlab_token else 'missing', 'present' if x_sonarqube_webhook_secret else 'missing')
+    
+    project = project_data.get("project") or {}
     
     # Try GitLab authentication
-    if x_gitlab_token and project_data.get("project", {}).get("id"):
-        project_id = str(project_data.get("project", {}).get("id"))
-        log.info(f"GitLab auth: Looking for subscription with project_id={project_id}")
-        
-        subscription = await db.find_subscription_by_project(
-            project_id=project_id,
-            project_type="gitlab",
-            status="active"
-        )
+    if x_gitlab_token and project.get("id"):
+        project_id = str(project["id"])
+        log.info("GitLab auth: Looking for subscription with project_id={}", project_id)
         
-        if subscription:
-            log.info(f"GitLab auth: Found subscription {subscription.get('subscription_id')}")
-            if subscription.get("webhook_secret"):
-                log.info(f"GitLab auth: Comparing secrets (header length: {len(x_gitlab_token)}, stored length: {len(subscription['webhook_secret'])})")
-                if hmac.compare_digest(x_gitlab_token, subscription["webhook_secret"]):
-                    log.info("GitLab auth: Secret comparison successful")
-                    return True
-                else:
-                    log.warning("GitLab auth: Secret comparison failed")
-            else:
-                log.warning("GitLab auth: No webhook_secret in subscription")
-        else:
-            log.warning(f"GitLab auth: No subscription found for project {project_id}")
+        secret = await get_subscription_secret(db, project_id, "gitlab")
+        if secret:
+            if _secret_matches(x_gitlab_token, secret):
+                log.info("GitLab auth: Secret comparison successful")
+                return True
+            log.warning("GitLab auth: Secret comparison failed")
     elif x_gitlab_token:
-        log.warning(f"GitLab auth: Missing project ID in data: {project_data.get('project', {})}")
+        log.warning("GitLab auth: Missing project ID in data: {}", project)
     else:
         log.info("GitLab auth: No X-Gitlab-Token header")
     
     # Try SonarQube authentication
-    if x_sonarqube_webhook_secret and project_data.get("project", {}).get("key"):
-        project_key = project_data.get("project", {}).get("key")
-        log.info(f"SonarQube auth: Looking for subscription with project_id={project_key}")
+    if x_sonarqube_webhook_secret and project.get("key"):
+        project_key = project["key"]
+        log.info("SonarQube auth: Looking for subscription with project_id={}", project_key)
         
-        subscription = await db.find_subscription_by_project(
-            project_id=project_key,
-            project_type="sonarqube", 
-            status="active"
-        )
-        
-        if subscription:
-            log.info(f"SonarQube auth: Found subscription {subscription.get('subscription_id')}")
-            if subscription.get("webhook_secret"):
-                log.info(f"SonarQube auth: Comparing secrets (header length: {len(x_sonarqube_webhook_secret)}, stored length: {len(subscription['webhook_secret'])})")
-                if hmac.compare_digest(x_sonarqube_webhook_secret, subscription["webhook_secret"]):
-                    log.info("SonarQube auth: Secret comparison successful")
-                    return True
-                else:
-                    log.warning("SonarQube auth: Secret comparison failed")
-            else:
-                log.warning("SonarQube auth: No webhook_secret in subscription")
-        else:
-            log.warning(f"SonarQube auth: No subscription found for project {project_key}")
+        secret = await get_subscription_secret(db, project_key, "sonarqube")
+        if secret:
+            if _secret_matches(x_sonarqube_webhook_secret, secret):
+                log.info("SonarQube auth: Secret comparison successful")
+                return True
+            log.warning("SonarQube auth: Secret comparison failed")
     elif x_sonarqube_webhook_secret:
-        log.warning(f"SonarQube auth: Missing project key in data: {project_data.get('project', {})}")
+        log.warning("SonarQube auth: Missing project key in data: {}", project)
     else:
         log.info("SonarQube auth: No X-Sonarqube-Webhook-Secret header")
     
     # Fallback to global secrets for backwards compatibility
-    if x_gitlab_token and settings.gitlab_webhook_secret:
+    if x_gitlab_token and _GITLAB_WEBHOOK_SECRET:
         log.info("GitLab auth: Trying global secret fallback")
-        if hmac.compare_digest(x_gitlab_token, settings.gitlab_webhook_secret):
+        if _secret_matches(x_gitlab_token, _GITLAB_WEBHOOK_SECRET):
             log.info("GitLab auth: Global secret comparison successful")
             return True
     
-    if x_sonarqube_webhook_secret and settings.sonarqube_webhook_secret:
+    if x_sonarqube_webhook_secret and _SONARQUBE_WEBHOOK_SECRET:
         log.info("SonarQube auth: Trying global secret fallback")
-        if hmac.compare_digest(x_sonarqube_webhook_secret, settings.sonarqube_webhook_secret):
+        if _secret_matches(x_sonarqube_webhook_secret, _SONARQUBE_WEBHOOK_SECRET):
             log.info("SonarQube auth: Global secret comparison successful")
             return True
     
     log.warning("Webhook auth: All authentication methods failed")
     return False
 
-async def handle_pipeline_webhook(data: Dict[str, Any], db: Database) -> Dict[str, Any]:
-    """Handle GitLab pipeline webhook events"""
-    pipeline_status = data.get("object_attributes", {}).get("status")
-    project_id = str(data.get("project", {}).get("id"))
+# GitLab retries deliveries it considers failed; remember recently accepted
+# (project, pipeline, status, finished_at) events so redeliveries skip
+# ingestion entirely. finished_at tells a retried pipeline that fails again
+# apart from a redelivery of the first failure. The key is reserved when the
+# event is queued and released if ingestion fails, so GitLab's retry is
+# accepted again.
+PIPELINE_EVENT_DEDUPE_TTL_SECONDS = 3600
+_accepted_pipeline_events: TTLCache = TTLCache(maxsize=10_000, ttl=PIPELINE_EVENT_DEDUPE_TTL_SECONDS)
+
+def handle_pipeline_webhook(data: Dict[str, Any], db: Database) -> Dict[str, Any]:
+    """Handle GitLab pipeline webhook events
+    
+    Session persistence and queue publishing run on the ingestion worker pool so the
+    webhook is acknowledged without waiting on the database or the queue.
+    Only the slimmed payload is stored on the session (see _slim_webhook).
+    """
+    attributes = data.get("object_attributes", {})
+    pipeline_status = attributes.get("status")
+    
+    # Successful pipelines only need the agent to settle fix attempts and
+    # resolve sessions; no session is created for them
+    if pipeline_status == "success":
+        project_id = str(data.get("project", {}).get("id"))
+        pipeline_id = str(attributes.get("id"))
+        message = {
+            "project_id": project_id,
+            "pipeline_id": pipeline_id,
+            "ref": attributes.get("ref")
+        }
+        _enqueue(publish_pipeline_success(f"pipeline_{project_id}_{pipeline_id}", message))
+        return {"status": "accepted", "message": "Pipeline success accepted for processing"}
     
     # Only process failed pipelines for immediate analysis
     if pipeline_status != "failed":
-        log.info(f"Ignoring pipeline with status: {pipeline_status}")
+        log.info("Ignoring pipeline with status: {}", pipeline_status)
         return {"status": "ignored", "reason": f"Pipeline status: {pipeline_status}"}
+    
+    event_key = (
+        str(data.get("project", {}).get("id")),
+        str(attributes.get("id")),
+        pipeline_status,
+        attributes.get("finished_at") or attributes.get("updated_at")
+    )
+    if event_key in _accepted_pipeline_events:
+        log.info("Ignoring duplicate delivery for pipeline {} of project {}", event_key[1], event_key[0])
+        return {"status": "duplicate", "reason": "Pipeline event already accepted"}
+    
+    session_id = str(_uuid4())
+    # Reserve the key now so a redelivery racing this ingestion is dropped
+    _accepted_pipeline_events[event_key] = session_id
+    try:
+        _enqueue(ingest_pipeline_failure(session_id, data, db, event_key))
+    except HTTPException:
+        _accepted_pipeline_events.pop(event_key, None)
+        raise
+    
+    return {
+        "status": "accepted",
+        "session_id": session_id,
+        "message": "Event accepted for processing"
+    }
 
-    # Check for existing session with same pipeline ID to avoid duplicates
-    pipeline_id = str(data.get("object_attributes", {}).get("id"))
-    existing_session = await db.find_session_by_unique_id("pipeline", project_id, pipeline_id)
+async def ingest_pipeline_failure(session_id: str, data: Dict[str, Any], db: Database, event_key: tuple):
+    """Persist the session for a failed pipeline and publish it to the queue
     
-    if existing_session:
-        session_id = existing_session["id"]  # Use 'id' column name
-        log.info(f"Found existing session {session_id} for pipeline {pipeline_id}, updating...")
+    Redeliveries for a pipeline that already has an active session update and
+    reuse that session instead of the freshly minted session_id. The dedupe
+    reservation for event_key is released if storing or publishing fails, so
+    GitLab's retry is free to try again.
+    """
+    try:
+        project = data.get("project") or {}
+        attributes = data.get("object_attributes") or {}
+        pipeline_status = attributes.get("status")
+        project_id = str(project.get("id"))
+        received_at = datetime.utcnow()
         
-        # Update existing session with latest data
-        await db.update_session(session_id, {
-            "pipeline_status": pipeline_status,
-            "updated_at": datetime.utcnow(),
-            "webhook_data": data
-        })
-    else:
-        # Create new session for new pipeline failure
-        session_id = str(uuid.uuid4())
+        pipeline_id = str(attributes.get("id"))
         session_data = {
             "id": session_id,  # Use 'id' column name
             "session_type": "pipeline",
             "project_id": project_id,
-            "project_name": data.get("project", {}).get("name"),
+            "project_name": project.get("name"),
             "pipeline_id": pipeline_id,
-            "pipeline_url": data.get("object_attributes", {}).get("url"),
+            "pipeline_url": attributes.get("url"),
             "pipeline_status": pipeline_status,
-            "branch": data.get("object_attributes", {}).get("ref"),
-            "commit_sha": data.get("object_attributes", {}).get("sha"),
+            "branch": attributes.get("ref"),
+            "commit_sha": attributes.get("sha"),
             "status": "active",
-            "created_at": datetime.utcnow(),
-            "expires_at": datetime.utcnow() + timedelta(minutes=settings.session_timeout_minutes),
-            "webhook_data": data
+            "created_at": received_at,
+            "expires_at": received_at + timedelta(minutes=settings.session_timeout_minutes),
+            "webhook_data": _slim_webhook(data)
         }
         
-        # Extract failed job info if failure
-        if pipeline_status == "failed":
-            failed_jobs = [job for job in data.get("builds", []) if job.get("status") == "failed"]
-            if failed_jobs:
-                failed_jobs.sort(key=lambda x: x.get("finished_at", ""), reverse=True)
-                first_failed = failed_jobs[0]
-                session_data["job_name"] = first_failed.get("name")
-                session_data["failed_stage"] = first_failed.get("stage")
-
-        # Store new session
-        await db.create_session(session_data)
-        log.info(f"Created new session {session_id} for pipeline {pipeline_id}")
-
-    # Determine if this is a quality failure by checking job names
-    if detect_quality_failure_from_pipeline(data):
-        event_type = "quality_failed"
-        log.info(f"Detected quality failure in pipeline {pipeline_id}")
-    else:
-        event_type = "pipeline_failed"
-        log.info(f"Detected pipeline failure in pipeline {pipeline_id}")
-    
-    # Publish to queue for agent to process
-    message = {
-        "event_type": event_type,
-        "session_id": session_id,
-        "project_id": project_id,
-        "pipeline_status": pipeline_status,
-        "webhook_data": data,
-        "timestamp": datetime.utcnow().isoformat()
-    }
-    
-    queue_instance = get_queue_publisher()
-    await queue_instance.connect()
-    await queue_instance.publish_event(event_type, session_id, message)
-    
-    log.info(f"Created session {session_id} and published to queue")
-    
-    return {
-        "status": "queued",
-        "session_id": session_id,
-        "message": "Event queued for processing"
-    }
+        # Extract failed job info and check for quality jobs in a single pass over builds
+        first_failed = None
+        quality_failure = False
+        for job in data.get("builds", ()):
+            if job.get("status") != "failed":
+                continue
+            if not quality_failure and is_quality_job(job):
+                quality_failure = True
+            if first_failed is None or (job.get("finished_at") or "") > (first_failed.get("finished_at") or ""):
+                first_failed = job
+        if first_failed:
+            session_data["job_name"] = first_failed.get("name")
+            session_data["failed_stage"] = first_failed.get("stage")
+        
+        # Create the session, or refresh the active one for a redelivered pipeline
+        stored_id = await db.upsert_pipeline_session(session_data)
+        if stored_id != session_id:
+            log.info("Updated existing session {} for pipeline {}", stored_id, pipeline_id)
+            session_id = stored_id
+        else:
+            log.info("Created new session {} for pipeline {}", session_id, pipeline_id)
+        
+        # Determine if this is a quality failure by checking job names
+        if quality_failure:
+            event_type = "quality_failed"
+            log.info("Detected quality failure in pipeline {}", pipeline_id)
+        else:
+            event_type = "pipeline_failed"
+            log.info("Detected pipeline failure in pipeline {}", pipeline_id)
+        
+        # Publish to queue for agent to process. The payload is stored on the
+        # session row, so the message carries only the session reference.
+        message = {
+            "event_type": event_type,
+            "session_id": session_id,
+            "project_id": project_id,
+            "pipeline_status": pipeline_status,
+            "timestamp": received_at.isoformat()
+        }
+        
+        queue_instance = get_queue_publisher()
+        await queue_instance.connect()
+        if not await queue_instance.publish_event(event_type, session_id, message):
+            log.error("Stored session {} but could not publish it to the queue", session_id)
+            _accepted_pipeline_events.pop(event_key, None)
+            return
+        
+        log.info("Stored session {} and published to queue", session_id)
+        
+    except Exception as e:
+        log.error("Failed to ingest pipeline webhook for session {}: {}", session_id, e, exc_info=True)
+        _accepted_pipeline_events.pop(event_key, None)
 
-async def handle_merge_request_webhook(data: Dict[str, Any], db: Database) -> Dict[str, Any]:
-    """Handle GitLab merge request webhook events"""
+def handle_merge_request_webhook(data: Dict[str, Any], body: bytes, db: Database) -> Dict[str, Any]:
+    """Handle GitLab merge request webhook events
+    
+    Tracked actions are published by the ingestion worker pool, like pipeline
+    failures, so the webhook is acknowledged without waiting on the queue.
+    """
     mr_attributes = data.get("object_attributes", {})
     mr_action = mr_attributes.get("action")
     mr_state = mr_attributes.get("state")
     project_id = str(data.get("project", {}).get("id"))
     mr_iid = str(mr_attributes.get("iid"))
     
-    log.info(f"Received MR webhook: action={mr_action}, state={mr_state}, project={project_id}, MR !{mr_iid}")
+    log.info("Received MR webhook: action={}, state={}, project={}, MR !{}", mr_action, mr_state, project_id, mr_iid)
     
     # Handle merge request events that we care about
     if mr_action in ["open", "update", "merge", "close"]:
@@ -243,21 +355,17 @@ async def handle_merge_request_webhook(data: Dict[str, Any], db: Database) -> Di
             "mr_iid": mr_iid,
             "mr_action": mr_action,
             "mr_state": mr_state,
-            "webhook_data": data,
-            "timestamp": datetime.utcnow().isoformat()
+            "webhook_data": orjson.Fragment(body),
+            "timestamp": datetime.now(timezone.utc).isoformat()
         }
         
-        queue_instance = get_queue_publisher()
-        await queue_instance.connect()
-        await queue_instance.publish_event(f"merge_request_{mr_action}", f"mr_{project_id}_{mr_iid}", message)
-        
-        log.info(f"Published MR event to queue: {mr_action} for MR !{mr_iid}")
+        _enqueue(publish_merge_request_event(mr_action, f"mr_{project_id}_{mr_iid}", message))
         
         return {
-            "status": "queued",
+            "status": "accepted",
             "mr_iid": mr_iid,
             "action": mr_action,
-            "message": f"MR {mr_action} event queued for processing"
+            "message": f"MR {mr_action} event accepted for processing"
         }
     else:
         return {
@@ -265,51 +373,209 @@ async def handle_merge_request_webhook(data: Dict[str, Any], db: Database) -> Di
             "reason": f"MR action '{mr_action}' not tracked"
         }
 
-def detect_quality_failure_from_pipeline(data: Dict[str, Any]) -> bool:
-    """Detect if pipeline failure is due to quality issues by analyzing job names"""
-    failed_jobs = [job for job in data.get("builds", []) if job.get("status") == "failed"]
+async def publish_pipeline_success(event_id: str, message: Dict[str, Any]):
+    """Publish a successful pipeline event to the queue"""
+    try:
+        queue_instance = get_queue_publisher()
+        await queue_instance.connect()
+        await queue_instance.publish_event("pipeline_success", event_id, message)
+        log.info("Published pipeline success to queue for {}", event_id)
+        
+    except Exception as e:
+        log.error("Failed to publish pipeline success {}: {}", event_id, e, exc_info=True)
+
+async def publish_merge_request_event(mr_action: str, event_id: str, message: Dict[str, Any]):
+    """Publish a merge request event to the queue"""
+    try:
+        queue_instance = get_queue_publisher()
+        await queue_instance.connect()
+        await queue_instance.publish_event(f"merge_request_{mr_action}", event_id, message)
+        
+        log.info("Published MR event to queue: {} for {}", mr_action, event_id)
+        
+    except Exception as e:
+        log.error("Failed to publish MR webhook {}: {}", event_id, e, exc_info=True)
+
+# Job names that mark a quality stage ("code-quality" is covered by "quality")
+_QUALITY_JOB_RE = re.compile(r"sonar|quality|scan|analysis|gate|lint|security", re.IGNORECASE)
+
+def is_quality_job(job: Dict[str, Any]) -> bool:
+    """Check whether a job's name marks it as a quality stage"""
+    return _QUALITY_JOB_RE.search(job.get("name") or "") is not None
+
+# Fields of a pipeline payload read back from the session by the agent and UI;
+# everything else (CI variables, full build records, user details) is dropped
+_SLIM_PROJECT_FIELDS = ("id", "name", "path_with_namespace", "web_url", "default_branch")
+_SLIM_BUILD_FIELDS = ("id", "name", "stage", "status", "started_at", "finished_at", "duration")
+
+def _slim_webhook(data: Dict[str, Any]) -> Dict[str, Any]:
+    """Reduce a pipeline webhook payload to the fields stored on the session"""
+    project = data.get("project") or {}
+    commit = data.get("commit") or {}
+    builds = []
+    for build in data.get("builds") or ():
+        slim_build = {field: build.get(field) for field in _SLIM_BUILD_FIELDS}
+        slim_build["runner"] = {"description": (build.get("runner") or {}).get("description")}
+        builds.append(slim_build)
+    
+    return {
+        "object_kind": data.get("object_kind"),
+        "object_attributes": {
+            key: value for key, value in (data.get("object_attributes") or {}).items()
+            if key != "variables"
+        },
+        "project": {field: project.get(field) for field in _SLIM_PROJECT_FIELDS},
+        "commit": {
+            "message": commit.get("message"),
+            "author": {"name": (commit.get("author") or {}).get("name")}
+        },
+        "builds": builds
+    }
+
+# GitLab event headers for the object kinds handled below
+_HANDLED_GITLAB_EVENTS = frozenset({"Pipeline Hook", "Merge Request Hook"})
+
+# Upper bound on events accepted in one batch delivery
+MAX_BATCH_EVENTS = 100
+
+async def _read_limited_body(request: Request) -> bytes:
+    """Read a webhook body, refusing it once it exceeds max_webhook_body_bytes
     
-    quality_keywords = ['sonar', 'quality', 'scan', 'analysis', 'gate', 'code-quality', 'lint', 'security']
+    A Content-Length header is checked before reading; chunked bodies without
+    one are counted as they stream in.
+    """
+    limit = settings.max_webhook_body_bytes
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > limit:
+        raise HTTPException(status_code=413, detail="Webhook payload too large")
     
-    for job in failed_jobs:
-        job_name = job.get("name", "").lower()
-        if any(keyword in job_name for keyword in quality_keywords):
-            return True
+    body = bytearray()
+    async for chunk in request.stream():
+        body += chunk
+        if len(body) > limit:
+            raise HTTPException(status_code=413, detail="Webhook payload too large")
+    return bytes(body)
+
+def _reject_missing_token(x_gitlab_token: Optional[str]):
+    """Refuse an unauthenticated GitLab webhook before reading or parsing the body
     
-    return False
+    Every GitLab secret (subscription or global) is checked against
+    X-Gitlab-Token, so without the header authentication cannot succeed.
+    """
+    if settings.webhook_auth_enabled and not x_gitlab_token:
+        raise HTTPException(status_code=401, detail="Invalid webhook authentication")
+
+async def process_gitlab_event(
+    data: Dict[str, Any],
+    body: bytes,
+    x_gitlab_token: Optional[str],
+    db: Database
+) -> Dict[str, Any]:
+    """Authenticate a parsed GitLab event and dispatch it by object kind
+    
+    body is the event's raw JSON, forwarded as-is with queued merge request events.
+    """
+    # Verify authentication with project data
+    if not await verify_webhook_auth(
+        project_data=data,
+        x_gitlab_token=x_gitlab_token,
+        db=db
+    ):
+        raise HTTPException(status_code=401, detail="Invalid webhook authentication")
+    
+    log.info("Received GitLab webhook: {}", data.get('object_kind', 'unknown'))
+    
+    object_kind = data.get("object_kind")
+    
+    # Handle different GitLab webhook types
+    if object_kind == "pipeline":
+        return handle_pipeline_webhook(data, db)
+    elif object_kind == "merge_request":
+        return handle_merge_request_webhook(data, body, db)
+    else:
+        return {"status": "ignored", "reason": f"Unsupported event type: {object_kind}"}
 
 @router.post("/gitlab")
 async def handle_gitlab_webhook(
+    request: Request,
+    x_gitlab_token: Optional[str] = Header(None, alias="X-Gitlab-Token"),
+    x_gitlab_event: Optional[str] = Header(None, alias="X-Gitlab-Event"),
+    db: Database = Depends(get_database)
+):
+    """Receive GitLab webhook and forward to queue
+    
+    Responses are built directly as ORJSONResponse, skipping FastAPI's
+    jsonable_encoder pass over the returned dict.
+    """
+    # Push, note, job etc. events share this URL; drop them before reading the body
+    if x_gitlab_event and x_gitlab_event not in _HANDLED_GITLAB_EVENTS:
+        return ORJSONResponse({"status": "ignored", "reason": f"Unsupported event type: {x_gitlab_event}"})
+    
+    try:
+        _reject_missing_token(x_gitlab_token)
+        body = await _read_limited_body(request)
+        try:
+            data = orjson.loads(body)
+        except orjson.JSONDecodeError:
+            raise HTTPException(status_code=400, detail="Invalid JSON payload")
+        
+        result = await process_gitlab_event(data, body, x_gitlab_token, db)
+        return ORJSONResponse(result, status_code=202 if result["status"] == "accepted" else 200)
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        log.error("Failed to process GitLab webhook: {}", e)
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/gitlab/batch")
+async def handle_gitlab_webhook_batch(
     request: Request,
     x_gitlab_token: Optional[str] = Header(None, alias="X-Gitlab-Token"),
     db: Database = Depends(get_database)
 ):
-    """Receive GitLab webhook and forward to queue"""
+    """Receive several GitLab events in one delivery and forward them to queue
+    
+    Accepts a JSON array of events or {"events": [...]}. Each event is
+    authenticated and dispatched independently; results are returned in
+    request order.
+    """
     try:
-        data = await request.json()
+        _reject_missing_token(x_gitlab_token)
+        body = await _read_limited_body(request)
+        try:
+            payload = orjson.loads(body)
+        except orjson.JSONDecodeError:
+            raise HTTPException(status_code=400, detail="Invalid JSON payload")
         
-        # Verify authentication with project data
-        if not await verify_webhook_auth(
-            project_data=data,
-            x_gitlab_token=x_gitlab_token,
-            db=db
-        ):
-            raise HTTPException(status_code=401, detail="Invalid webhook authentication")
+        events = payload.get("events") if isinstance(payload, dict) else payload
+        if not isinstance(events, list) or not all(isinstance(event, dict) for event in events):
+            raise HTTPException(status_code=400, detail="Expected a list of event objects")
+        if len(events) > MAX_BATCH_EVENTS:
+            raise HTTPException(status_code=413, detail=f"Batch exceeds {MAX_BATCH_EVENTS} events")
         
-        log.info(f"Received GitLab webhook: {data.get('object_kind', 'unknown')}")
+        outcomes = await asyncio.gather(
+            *(process_gitlab_event(event, orjson.dumps(event), x_gitlab_token, db) for event in events),
+            return_exceptions=True
+        )
         
-        object_kind = data.get("object_kind")
+        results = []
+        for outcome in outcomes:
+            if isinstance(outcome, HTTPException):
+                results.append({"status": "rejected", "reason": outcome.detail})
+            elif isinstance(outcome, BaseException):
+                log.error("Failed to process batched GitLab event: {}", outcome)
+                results.append({"status": "error", "reason": str(outcome)})
+            else:
+                results.append(outcome)
         
-        # Handle different GitLab webhook types
-        if object_kind == "pipeline":
-            return await handle_pipeline_webhook(data, db)
-        elif object_kind == "merge_request":
-            return await handle_merge_request_webhook(data, db)
-        else:
-            return {"status": "ignored", "reason": f"Unsupported event type: {object_kind}"}
+        accepted = any(result["status"] == "accepted" for result in results)
+        return ORJSONResponse({"results": results}, status_code=202 if accepted else 200)
         
+    except HTTPException:
+        raise
     except Exception as e:
-        log.error(f"Failed to process GitLab webhook: {e}")
+        log.error("Failed to process GitLab webhook batch: {}", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 # SonarQube webhook endpoint removed - quality detection done in GitLab pipeline analysis
\ No newline at end of file
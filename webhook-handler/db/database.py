@@ -5,6 +5,7 @@ from datetime import datetime
 from utils.logger import log
 from config import settings
 import json
+import orjson
 
 class Database:
     """Database operations for webhook handler"""
@@ -72,13 +73,77 @@ class Database:
                 session_data.get("mr_url"),
                 session_data.get("unique_id"),
                 session_data.get("subscription_id"),
-                json.dumps(session_data.get("webhook_data", {})),
+                orjson.dumps(session_data.get("webhook_data", {})).decode(),
                 session_data["created_at"],
                 session_data["expires_at"],
                 session_data.get("status", "active")
             )
             return session_id
     
+    async def upsert_pipeline_session(self, session_data: Dict[str, Any]) -> str:
+        """Create a pipeline session, or refresh the active one for the same pipeline
+        
+        Runs as a single statement so a webhook costs one round-trip whether the
+        pipeline is new or a redelivery. Returns the id of the stored session.
+        """
+        query = """
+            WITH updated AS (
+                UPDATE sessions
+                SET pipeline_status = $6,
+                    webhook_data = $20::jsonb,
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE id = (
+                    SELECT id FROM sessions
+                    WHERE session_type = $2 AND project_id = $3 AND pipeline_id = $5 AND status = 'active'
+                    ORDER BY created_at DESC
+                    LIMIT 1
+                )
+                RETURNING id
+            ), inserted AS (
+                INSERT INTO sessions (
+                    id, session_type, project_id, project_name,
+                    pipeline_id, pipeline_status, pipeline_url, 
+                    job_name, job_id, branch, failed_stage, commit_sha,
+                    sonarqube_key, quality_gate_status, mr_id, mr_title, mr_url,
+                    unique_id, subscription_id, webhook_data, created_at, expires_at, status
+                )
+                SELECT $1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11, $12, $13, $14, $15, $16, $17, $18, $19, $20::jsonb, $21, $22, $23
+                WHERE NOT EXISTS (SELECT 1 FROM updated)
+                RETURNING id
+            )
+            SELECT id FROM updated
+            UNION ALL
+            SELECT id FROM inserted
+        """
+        
+        async with self.pool.acquire() as conn:
+            return await conn.fetchval(
+                query,
+                session_data["id"],
+                session_data["session_type"],
+                session_data["project_id"],
+                session_data.get("project_name"),
+                session_data.get("pipeline_id"),
+                session_data.get("pipeline_status"),
+                session_data.get("pipeline_url"),
+                session_data.get("job_name"),
+                session_data.get("job_id"),
+                session_data.get("branch"),
+                session_data.get("failed_stage"),
+                session_data.get("commit_sha"),
+                session_data.get("sonarqube_key"),
+                session_data.get("quality_gate_status"),
+                session_data.get("mr_id"),
+                session_data.get("mr_title"),
+                session_data.get("mr_url"),
+                session_data.get("unique_id"),
+                session_data.get("subscription_id"),
+                orjson.dumps(session_data.get("webhook_data", {})).decode(),
+                session_data["created_at"],
+                session_data["expires_at"],
+                session_data.get("status", "active")
+            )
+    
     async def get_subscription(self, subscription_id: str) -> Optional[Dict[str, Any]]:
         """Get subscription details"""
         query = """
@@ -264,7 +329,7 @@ class Database:
         
         # Convert webhook_data to JSON if present
         if "webhook_data" in update_data:
-            update_data["webhook_data"] = json.dumps(update_data["webhook_data"])
+            update_data["webhook_data"] = orjson.dumps(update_data["webhook_data"]).decode()
         
         for key, value in update_data.items():
             set_clauses.append(f"{key} = ${param_count}")
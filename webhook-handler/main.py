@@ -1,16 +1,18 @@
 """Optimized Webhook Handler Service - Main Application"""
 from fastapi import FastAPI, Request, Header, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from contextlib import asynccontextmanager
 import asyncio
-import hmac
+import platform
 from typing import Optional
 from utils.logger import log
 from config import settings
-from api.webhooks import router as webhook_router
+from api.webhooks import router as webhook_router, start_ingest_workers, stop_ingest_workers
 from api.subscriptions import router as subscription_router
 from api.health import router as health_router
 from services.event_processor import EventProcessor
+from services.webhook_manager import close_http_client
 from db.database import Database
 
 
@@ -52,6 +54,8 @@ async def lifespan(app: FastAPI):
             name="health_check_task"
         )
         
+        start_ingest_workers()
+        
         log.info("Background tasks started successfully")
         
         yield
@@ -74,6 +78,10 @@ async def lifespan(app: FastAPI):
                 except Exception as e:
                     log.error(f"Error during task cleanup: {e}")
         
+        # Let accepted webhooks finish storing and publishing before the pool closes
+        await stop_ingest_workers()
+        await close_http_client()
+        
         # Close database connections
         if app_state.db:
             await app_state.db.close()
@@ -144,6 +152,7 @@ app = FastAPI(
     version="2.0.0",
     lifespan=lifespan,
     # Performance optimizations
+    default_response_class=ORJSONResponse,
     docs_url="/docs" if settings.environment == "development" else None,
     redoc_url="/redoc" if settings.environment == "development" else None,
 )
@@ -223,16 +232,62 @@ async def startup_event():
     log.info(f"Webhook Handler started in {settings.environment} mode")
 
 
+def _kernel_supports_io_uring() -> bool:
+    """io_uring loops need Linux 5.11 or newer"""
+    if platform.system() != "Linux":
+        return False
+    try:
+        major, minor = (int(part) for part in platform.release().split(".")[:2])
+    except ValueError:
+        return False
+    return (major, minor) >= (5, 11)
+
+
+def configure_event_loop() -> str:
+    """Install the event loop policy selected by EVENT_LOOP, falling back gracefully"""
+    choice = settings.event_loop.lower()
+    
+    if choice == "uring" and _kernel_supports_io_uring():
+        try:
+            import uringcore
+            asyncio.set_event_loop_policy(uringcore.EventLoopPolicy())
+            return "uring"
+        except ImportError:
+            log.warning("uringcore not installed, falling back to uvloop")
+        choice = "uvloop"
+    elif choice == "uring":
+        log.warning("io_uring not supported on this kernel, falling back to uvloop")
+        choice = "uvloop"
+    
+    if choice == "uvloop":
+        try:
+            import uvloop
+            asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+            return "uvloop"
+        except ImportError:
+            log.warning("uvloop not installed, falling back to asyncio")
+    
+    return "asyncio"
+
+
 if __name__ == "__main__":
     import uvicorn
+    loop_name = configure_event_loop()
+    log.info(f"Using {loop_name} event loop")
+    # Reload serves the app from a spawned subprocess that never runs
+    # configure_event_loop, so it would silently fall back to asyncio
+    reload = settings.environment == "development"
+    if reload and loop_name != "asyncio":
+        log.warning(f"Auto-reload disabled so the {loop_name} event loop is used; set EVENT_LOOP=asyncio to enable it")
+        reload = False
+    # loop="none" keeps the policy installed above instead of uvicorn's own choice;
+    # the C httptools parser (from uvicorn[standard]) is required, not just preferred
     uvicorn.run(
         "main:app",
         host="0.0.0.0",
-        port=8001,
-        reload=settings.environment == "development",
-        log_level="info"
+        port=settings.port,
+        reload=reload,
+        log_level="info",
+        loop="none",
+        http="httptools"
     )
-
-if __name__ == "__main__":
-    import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=settings.port)
\ No newline at end of file
@@ -1,12 +1,12 @@
 """Queue Publisher for webhook events"""
-import json
 import asyncio
+import orjson
 from typing import Dict, Any
 import aio_pika
 import boto3
 from utils.logger import log
 from config import settings
-from datetime import datetime
+from datetime import datetime, timezone
 
 class QueuePublisher:
     """Publish events to message queue (RabbitMQ or SQS)"""
@@ -58,7 +58,7 @@ class QueuePublisher:
                 "event_type": event_type,
                 "session_id": session_id,
                 "data": data,
-                "timestamp": datetime.utcnow().isoformat()
+                "timestamp": datetime.now(timezone.utc).isoformat()
             }
             
             if self.queue_type == "rabbitmq":
@@ -68,7 +68,7 @@ class QueuePublisher:
                 exchange = await self.channel.get_exchange("webhook_events")
                 await exchange.publish(
                     aio_pika.Message(
-                        body=json.dumps(message).encode(),
+                        body=orjson.dumps(message),
                         delivery_mode=aio_pika.DeliveryMode.PERSISTENT
                     ),
                     routing_key=f"webhook.{event_type}"
@@ -78,7 +78,7 @@ class QueuePublisher:
             elif self.queue_type == "sqs":
                 self.sqs_client.send_message(
                     QueueUrl=settings.sqs_queue_url,
-                    MessageBody=json.dumps(message),
+                    MessageBody=orjson.dumps(message).decode(),
                     MessageAttributes={
                         'event_type': {'StringValue': event_type, 'DataType': 'String'},
                         'session_id': {'StringValue': session_id, 'DataType': 'String'}
@@ -1,9 +1,27 @@
 """Webhook Manager for auto-configuring project webhooks"""
 import httpx
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from utils.logger import log
 from config import settings
 
+# Webhook setup, removal and verification calls share one pooled client, so
+# repeated calls to the same GitLab/SonarQube host reuse open connections
+_http_client: Optional[httpx.AsyncClient] = None
+
+async def get_http_client() -> httpx.AsyncClient:
+    """Get the shared client for project webhook API calls (see close_http_client)"""
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(limits=httpx.Limits(max_keepalive_connections=10))
+    return _http_client
+
+async def close_http_client():
+    """Close the shared webhook API client on shutdown"""
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
 class WebhookManager:
     """Manage webhook subscriptions for GitLab/SonarQube projects"""
     
@@ -19,25 +37,25 @@ class WebhookManager:
         """Configure GitLab webhooks for a project"""
         webhook_ids = []
         
-        async with httpx.AsyncClient() as client:
-            headers = {"PRIVATE-TOKEN": access_token}
-            
-            # Configure pipeline webhook
-            if "pipeline" in events:
-                response = await client.post(
-                    f"{project_url}/api/v4/projects/{project_id}/hooks",
-                    headers=headers,
-                    json={
-                        "url": webhook_url,
-                        "token": webhook_secret,
-                        "pipeline_events": True,
-                        "push_events": False,
-                        "merge_requests_events": "merge_request" in events
-                    }
-                )
-                if response.status_code == 201:
-                    webhook_ids.append(str(response.json()["id"]))
-                    log.info(f"Created GitLab webhook for project {project_id}")
+        client = await get_http_client()
+        headers = {"PRIVATE-TOKEN": access_token}
+        
+        # Configure pipeline webhook
+        if "pipeline" in events:
+            response = await client.post(
+                f"{project_url}/api/v4/projects/{project_id}/hooks",
+                headers=headers,
+                json={
+                    "url": webhook_url,
+                    "token": webhook_secret,
+                    "pipeline_events": True,
+                    "push_events": False,
+                    "merge_requests_events": "merge_request" in events
+                }
+            )
+            if response.status_code == 201:
+                webhook_ids.append(str(response.json()["id"]))
+                log.info(f"Created GitLab webhook for project {project_id}")
         
         return webhook_ids
     
@@ -52,22 +70,22 @@ class WebhookManager:
         """Configure SonarQube webhooks"""
         webhook_ids = []
         
-        async with httpx.AsyncClient() as client:
-            headers = {"Authorization": f"Bearer {access_token}"}
-            
-            response = await client.post(
-                f"{project_url}/api/webhooks/create",
-                headers=headers,
-                json={
-                    "name": f"cicd-assistant-{project_id}",
-                    "url": webhook_url,
-                    "project": project_id,
-                    "secret": webhook_secret
-                }
-            )
-            if response.status_code == 200:
-                webhook_ids.append(response.json()["webhook"]["key"])
-                log.info(f"Created SonarQube webhook for project {project_id}")
+        client = await get_http_client()
+        headers = {"Authorization": f"Bearer {access_token}"}
+        
+        response = await client.post(
+            f"{project_url}/api/webhooks/create",
+            headers=headers,
+            json={
+                "name": f"cicd-assistant-{project_id}",
+                "url": webhook_url,
+                "project": project_id,
+                "secret": webhook_secret
+            }
+        )
+        if response.status_code == 200:
+            webhook_ids.append(response.json()["webhook"]["key"])
+            log.info(f"Created SonarQube webhook for project {project_id}")
         
         return webhook_ids
     
@@ -79,22 +97,22 @@ class WebhookManager:
         webhook_ids: List[str]
     ):
         """Remove webhooks when subscription expires"""
-        async with httpx.AsyncClient() as client:
-            if project_type == "gitlab":
-                headers = {"PRIVATE-TOKEN": access_token}
-                for webhook_id in webhook_ids:
-                    await client.delete(
-                        f"{project_url}/api/v4/hooks/{webhook_id}",
-                        headers=headers
-                    )
-            elif project_type == "sonarqube":
-                headers = {"Authorization": f"Bearer {access_token}"}
-                for webhook_id in webhook_ids:
-                    await client.post(
-                        f"{project_url}/api/webhooks/delete",
-                        headers=headers,
-                        json={"webhook": webhook_id}
-                    )
+        client = await get_http_client()
+        if project_type == "gitlab":
+            headers = {"PRIVATE-TOKEN": access_token}
+            for webhook_id in webhook_ids:
+                await client.delete(
+                    f"{project_url}/api/v4/hooks/{webhook_id}",
+                    headers=headers
+                )
+        elif project_type == "sonarqube":
+            headers = {"Authorization": f"Bearer {access_token}"}
+            for webhook_id in webhook_ids:
+                await client.post(
+                    f"{project_url}/api/webhooks/delete",
+                    headers=headers,
+                    json={"webhook": webhook_id}
+                )
     
     async def verify_gitlab_webhooks(
         self,
@@ -104,18 +122,18 @@ class WebhookManager:
     ) -> bool:
         """Verify GitLab webhooks are still active"""
         try:
-            async with httpx.AsyncClient() as client:
-                headers = {"PRIVATE-TOKEN": access_token}
-                
-                for webhook_id in webhook_ids:
-                    response = await client.get(
-                        f"https://gitlab.com/api/v4/projects/{project_id}/hooks/{webhook_id}",
-                        headers=headers
-                    )
-                    if response.status_code != 200:
-                        return False
-                
-                return True
+            client = await get_http_client()
+            headers = {"PRIVATE-TOKEN": access_token}
+            
+            for webhook_id in webhook_ids:
+                response = await client.get(
+                    f"https://gitlab.com/api/v4/projects/{project_id}/hooks/{webhook_id}",
+                    headers=headers
+                )
+                if response.status_code != 200:
+                    return False
+            
+            return True
         except Exception:
             return False
     
@@ -127,21 +145,21 @@ class WebhookManager:
     ) -> bool:
         """Verify SonarQube webhooks are still active"""
         try:
-            async with httpx.AsyncClient() as client:
-                headers = {"Authorization": f"Bearer {access_token}"}
-                
-                response = await client.get(
-                    f"http://sonarqube:9000/api/webhooks/list",
-                    headers=headers,
-                    params={"project": project_key}
-                )
-                
-                if response.status_code != 200:
-                    return False
-                
-                active_webhooks = response.json().get("webhooks", [])
-                active_webhook_keys = [wh["key"] for wh in active_webhooks]
-                
-                return all(webhook_id in active_webhook_keys for webhook_id in webhook_ids)
+            client = await get_http_client()
+            headers = {"Authorization": f"Bearer {access_token}"}
+            
+            response = await client.get(
+                f"http://sonarqube:9000/api/webhooks/list",
+                headers=headers,
+                params={"project": project_key}
+            )
+            
+            if response.status_code != 200:
+                return False
+            
+            active_webhooks = response.json().get("webhooks", [])
+            active_webhook_keys = [wh["key"] for wh in active_webhooks]
+            
+            return all(webhook_id in active_webhook_keys for webhook_id in webhook_ids)
         except Exception:
             return False
\ No newline at end of file